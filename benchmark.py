@@ -0,0 +1,213 @@
+"""Benchmarks for the rules and rendering hot paths, results are written as JSON so runs can be compared.
+Perft counts every jump of a combo as its own move, the expected counts came from the original
+list of lists rules so they also check the rules are still right"""
+import argparse, copy, json, os, platform, random, sys, time
+from engine import Engine, BOARD_SIZE, squareIndex, positionMoves
+
+
+PERFT_EXPECTED = {
+    "start": [7, 49, 302, 1469, 7361, 36768, 179255],
+    "promotionCombo": [1, 1, 1, 2, 6, 10],
+    "openKings": [8, 72, 477, 3903, 23384, 174629],
+    "captureChoices": [3, 5, 24, 100, 485, 2270],
+}
+
+
+def _bits(coords):
+    bits = 0
+    for x, y in coords:
+        bits |= 1 << squareIndex(x, y)
+    return bits
+
+
+def perftPositions():
+    """Returns dict of name to position tuple, the positions PERFT_EXPECTED has counts for"""
+    start = Engine()
+    start.newGame()
+    return {"start": start.getPosition(),
+            #A man kings part way through a combo then carries on taking backwards as a king
+            "promotionCombo": (_bits([(1,5),(0,0),(2,0)]), _bits([(2,6),(4,6),(6,4),(7,1)]), _bits([(7,1)]), True, None),
+            "openKings": (_bits([(1,1),(5,1)]), _bits([(2,6),(6,6),(3,5)]), _bits([(1,1),(5,1),(2,6),(6,6)]), True, None),
+            "captureChoices": (_bits([(1,3),(3,3),(5,3),(2,2),(6,2),(0,0)]),
+                               _bits([(2,4),(4,4),(6,4),(3,5),(5,7),(7,7)]), 0, True, None)}
+
+
+def perft(game, depth):
+    """Counts the move sequences of length depth from the game's position, using the Engine's own
+    moveable piece and possible move bookkeeping and undoing each move after it"""
+    if depth == 0:
+        return 1
+    moves = game.getLegalMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        record = game._movePiece(*move)
+        nodes += perft(game, depth - 1)
+        game._unmovePiece(record)
+    return nodes
+
+
+def runPerft(maxDepth):
+    results = []
+    for name, position in perftPositions().items():
+        game = Engine()
+        game.setPosition(position)
+        for depth in range(1, min(maxDepth, len(PERFT_EXPECTED[name])) + 1):
+            startTime = time.perf_counter()
+            nodes = perft(game, depth)
+            elapsed = time.perf_counter() - startTime
+            results.append({"position": name, "depth": depth, "nodes": nodes,
+                            "expected": PERFT_EXPECTED[name][depth - 1],
+                            "correct": nodes == PERFT_EXPECTED[name][depth - 1],
+                            "seconds": elapsed, "nodesPerSecond": nodes / elapsed if elapsed > 0 else 0.0})
+    return results
+
+
+def _timeCall(function, calls, repeats=5):
+    """Returns the best time per call in nanoseconds over repeats runs"""
+    best = None
+    for repeat in range(repeats):
+        startTime = time.perf_counter()
+        for call in range(calls):
+            function()
+        elapsed = (time.perf_counter() - startTime) / calls
+        if best == None or elapsed < best:
+            best = elapsed
+    return best * 1e9
+
+
+def _midgame(seed=1, moves=12, size=BOARD_SIZE):
+    """Returns an Engine a few random moves into a game"""
+    rng = random.Random(seed)
+    game = Engine(size)
+    game.newGame()
+    for i in range(moves):
+        game.makeMove(*rng.choice(game.getLegalMoves())[:4])
+    return game
+
+
+def runMicro(calls):
+    """Times _setUpTurn, _movePiece and _createKings on a midgame position, and copying
+    the game as a snapshot, as a clone and with copy.deepcopy"""
+    game = _midgame()
+    move = game.getLegalMoves()[0]
+
+    def moveAndUndo():
+        game._unmovePiece(game._movePiece(*move))
+
+    return {"setUpTurnNs": _timeCall(game._setUpTurn, calls),
+            "movePieceWithUndoNs": _timeCall(moveAndUndo, calls),
+            "createKingsNs": _timeCall(game._createKings, calls),
+            "findMoveablePiecesNs": _timeCall(lambda: game._findMoveablePieces(game.getTurn()), calls),
+            "snapshotNs": _timeCall(game.getSnapshot, calls),
+            "cloneNs": _timeCall(game.clone, calls),
+            "deepcopyNs": _timeCall(lambda: copy.deepcopy(game), max(1, calls // 10))}
+
+
+def _quietMidgames(size, count, moves=12):
+    """Returns count Engines a few random moves into a game, skipping seeds that leave a capture to make
+    so every size is timed on the same kind of move"""
+    games = []
+    seed = 0
+    while len(games) < count:
+        seed += 1
+        game = _midgame(seed, moves, size)
+        legalMoves = game.getLegalMoves()
+        if legalMoves != [] and not legalMoves[0][4]:
+            games.append(game)
+    return games
+
+
+def runBoardSizes(calls, sizes=(8, 10, 12), positions=8):
+    """Times move generation and a move with undo on quiet midgame positions of each board size,
+    averaged over positions positions. Move generation is also given per move found so sizes can be compared"""
+    results = {}
+    for size in sizes:
+        games = _quietMidgames(size, positions)
+        generateNs = 0.0
+        movePieceNs = 0.0
+        moveCount = 0
+        for game in games:
+            position = game.getPosition()
+            geometry = game.getGeometry()
+            move = game.getLegalMoves()[0]
+
+            def moveAndUndo():
+                game._unmovePiece(game._movePiece(*move))
+
+            generateNs += _timeCall(lambda: positionMoves(position, geometry), calls)
+            movePieceNs += _timeCall(moveAndUndo, calls)
+            moveCount += len(positionMoves(position, geometry))
+        results[str(size)] = {"positions": positions,
+                              "movesPerPosition": moveCount / positions,
+                              "positionMovesNs": generateNs / positions,
+                              "positionMovesPerMoveNs": generateNs / moveCount,
+                              "movePieceWithUndoNs": movePieceNs / positions}
+    return results
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _timeRendering(frames, method):
+    """Plays the same moves and mouse positions every time, timing one Renderer method a frame.
+    Each call gets its own Game so one method never resets what the other has cached"""
+    import main
+    game = main.Game()
+    game._initialise()
+    render = getattr(game.renderer, method)
+    rng = random.Random(2)
+    times = []
+    for frame in range(frames):
+        if frame % 10 == 9:
+            if game.getWinner() != None:
+                game._initialise()
+            else:
+                game.makeMove(*rng.choice(game.getLegalMoves())[:4])
+        highlighted = game._highlightPieceCheck(rng.randrange(8), rng.randrange(3, 11))
+        startTime = time.perf_counter()
+        render(game._board, game._player1, game._player2, highlighted, None, None, game.getWinner())
+        times.append((time.perf_counter() - startTime) * 1000)
+    return times
+
+
+def runRender(frames):
+    """Times Renderer.renderGame and renderChanges with SDL's dummy video driver, returns milliseconds per frame"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    summary = {}
+    for name in ("renderGame", "renderChanges"):
+        times = _timeRendering(frames, name)
+        summary[name] = {"frames": frames, "meanMs": sum(times) / len(times),
+                         "p50Ms": _percentile(times, 0.5), "p95Ms": _percentile(times, 0.95)}
+    return summary
+
+
+def runBenchmarks(perftDepth=6, microCalls=2000, renderFrames=300):
+    """Runs every benchmark, renderFrames of 0 skips rendering. Returns the results as a dict"""
+    results = {"python": sys.version.split()[0], "platform": platform.platform(), "time": time.time(),
+               "perft": runPerft(perftDepth), "micro": runMicro(microCalls),
+               "boardSizes": runBoardSizes(microCalls)}
+    if renderFrames > 0:
+        results["render"] = runRender(renderFrames)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the checkers rules and renderer")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--perft-depth", type=int, default=6)
+    parser.add_argument("--micro-calls", type=int, default=2000)
+    parser.add_argument("--render-frames", type=int, default=300, help="0 skips the render benchmark")
+    args = parser.parse_args()
+    results = runBenchmarks(args.perft_depth, args.micro_calls, args.render_frames)
+    with open(args.output, "w") as outputFile:
+        json.dump(results, outputFile, indent=2)
+    failed = [entry for entry in results["perft"] if not entry["correct"]]
+    for entry in failed:
+        print("perft mismatch", entry["position"], "depth", entry["depth"], entry["nodes"], "!=", entry["expected"])
+    print("wrote", args.output)
+    sys.exit(1 if failed else 0)
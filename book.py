@@ -0,0 +1,142 @@
+"""Opening book built from played games. The book file is a sorted array of fixed size
+entries, one per (position, move), so lookups are a binary search over the mmapped file"""
+import argparse, json, mmap, struct
+from engine import Engine, playPositionMove, positionMoves
+from search import zobristHash
+
+
+MAGIC = b"CKBK"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+ENTRY = struct.Struct("<QHIII")     #Position key, move, games, white wins, black wins
+KEY = struct.Struct("<Q")
+NO_TAKEN = 63
+
+
+def encodeMove(move):
+    """Packs a (fromIndex, toIndex, takenIndex) move into 16 bits"""
+    fromIndex, toIndex, takenIndex = move
+    if takenIndex == None:
+        takenIndex = NO_TAKEN
+    return fromIndex | (toIndex << 5) | (takenIndex << 10)
+
+
+def decodeMove(code):
+    takenIndex = code >> 10
+    if takenIndex == NO_TAKEN:
+        takenIndex = None
+    return (code & 31, (code >> 5) & 31, takenIndex)
+
+
+def startingPosition():
+    game = Engine()
+    game.newGame()
+    return game.getPosition()
+
+
+def buildBook(games, outputPath, maxPlies=16, minGames=1):
+    """games is an iterable of (moveList, winner) with winner "White", "Black" or None.
+    Counts every position and move in the first maxPlies moves of each game and writes the
+    ones seen in at least minGames games to outputPath. Returns the number of entries written"""
+    counts = {}
+    start = startingPosition()
+    startKey = zobristHash(start)
+    for moveList, winner in games:
+        position = start
+        key = startKey
+        for move in moveList[:maxPlies]:
+            move = tuple(move)
+            stats = counts.setdefault((key, encodeMove(move)), [0, 0, 0])
+            stats[0] += 1
+            if winner == "White":
+                stats[1] += 1
+            elif winner == "Black":
+                stats[2] += 1
+            position = playPositionMove(position, move)
+            key = zobristHash(position)
+    entries = sorted((key, move, stats) for (key, move), stats in counts.items() if stats[0] >= minGames)
+    with open(outputPath, "wb") as outputFile:
+        outputFile.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for key, move, stats in entries:
+            outputFile.write(ENTRY.pack(key, move, stats[0], stats[1], stats[2]))
+    return len(entries)
+
+
+def readSelfPlayGames(path):
+    """Yields (moveList, winner) from a selfplay.py results file made with --record-moves"""
+    with open(path) as gamesFile:
+        for line in gamesFile:
+            result = json.loads(line)
+            if "moveList" in result:
+                yield (result["moveList"], result["winner"])
+
+
+class OpeningBook(object):
+    """Reads a book file through mmap, only the entries a lookup touches are read from disk"""
+    def __init__(self, path, minGames=2):
+        """minGames is how many games a move must have been played in before chooseMove uses it"""
+        self.minGames = minGames
+        self._file = open(path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not an opening book file")
+
+    def getSize(self):
+        return self._count
+
+    def _keyAt(self, entryNumber):
+        return KEY.unpack_from(self._buffer, HEADER.size + entryNumber * ENTRY.size)[0]
+
+    def getMoves(self, position):
+        """Returns list of (move, games, whiteWins, blackWins) for a position, empty if it is not in the book"""
+        key = zobristHash(position)
+        low = 0
+        high = self._count
+        while low < high:                  #Find the first entry for key
+            middle = (low + high) // 2
+            if self._keyAt(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        bookMoves = []
+        while low < self._count and self._keyAt(low) == key:
+            entryKey, move, games, whiteWins, blackWins = ENTRY.unpack_from(self._buffer, HEADER.size + low * ENTRY.size)
+            bookMoves.append((decodeMove(move), games, whiteWins, blackWins))
+            low += 1
+        return bookMoves
+
+    def chooseMove(self, position):
+        """Returns the book move that has scored best for the side to move, or None if there is none.
+        Only moves that are legal in position are returned, in case of a key collision"""
+        legalMoves = positionMoves(position)
+        bestMove = None
+        bestScore = None
+        for move, games, whiteWins, blackWins in self.getMoves(position):
+            if games < self.minGames or move not in legalMoves:
+                continue
+            if position[3]:
+                wins = whiteWins
+            else:
+                wins = blackWins
+            draws = games - whiteWins - blackWins
+            score = ((wins + draws / 2) / games, games)
+            if bestScore == None or score > bestScore:
+                bestScore = score
+                bestMove = move
+        return bestMove
+
+    def close(self):
+        self._buffer.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book from selfplay.py games made with --record-moves")
+    parser.add_argument("games", help="selfplay.py results file")
+    parser.add_argument("--output", default="opening.book")
+    parser.add_argument("--plies", type=int, default=16, help="moves from the start of each game to add")
+    parser.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games")
+    args = parser.parse_args()
+    entries = buildBook(readSelfPlayGames(args.games), args.output, args.plies, args.min_games)
+    print("wrote", entries, "entries to", args.output)
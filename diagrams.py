@@ -0,0 +1,147 @@
+"""Draws positions to PNG files without opening a window, for reports and training data.
+The game's own Renderer draws onto an offscreen surface, so a diagram is exactly what the game
+window shows for that position with the mouse off the board. One surface and its cached sprites
+are used for every position, and large batches are shared out over a process pool"""
+import argparse, itertools, json, multiprocessing, os, sys, time
+import pygame
+from engine import Engine, BOARD_SIZE, getGeometry, playPositionMove, squareIndex
+from main import Renderer
+import pdn
+
+
+class DiagramRenderer(object):
+    """Renders positions from engine.getPosition, the surface returned is drawn over for the
+    next position so copy it to keep it"""
+    def __init__(self, boardSize=BOARD_SIZE):
+        pygame.font.init()
+        self._renderer = Renderer(boardSize, offscreen=True)
+        self._game = Engine(boardSize)
+        self._game.newGame()
+
+
+    def renderPosition(self, position):
+        """Draws position with a piece partway through a combo selected and its moves shown,
+        like the game does, and the winning screen if the side to move has lost"""
+        game = self._game
+        game.setPosition(position)
+        selectedCoords = None
+        availableSquares = None
+        if position[4] != None:
+            selectedCoords = game.getGeometry().squareCoords(position[4])
+            availableSquares = [move[2:] for move in game.getLegalMoves()]
+        whitePlayer, blackPlayer = game.getPlayers()
+        self._renderer.renderGame(game.getBoard(), whitePlayer, blackPlayer, None, selectedCoords,
+                                  availableSquares, game.getWinner())
+        return self._renderer.getSurface()
+
+
+    def savePosition(self, position, path):
+        """Writes the diagram of position to path, as PNG if path ends in .png"""
+        pygame.image.save(self.renderPosition(position), path)
+
+
+
+def positionsFromMoves(moveList, boardSize=BOARD_SIZE):
+    """moveList is (fromIndex, toIndex, takenIndex) moves from the start of a game, such as a
+    selfplay.py moveList. Yields the starting position and the position after every move"""
+    game = Engine(boardSize)
+    game.newGame()
+    position = game.getPosition()
+    geometry = getGeometry(boardSize)
+    yield position
+    for move in moveList:
+        position = playPositionMove(position, tuple(move), geometry)
+        yield position
+
+
+def readSelfPlayPositions(path):
+    """Yields (name, position) for every position of every game in a selfplay.py --record-moves results file"""
+    with open(path) as resultsFile:
+        for line in resultsFile:
+            result = json.loads(line)
+            for number, position in enumerate(positionsFromMoves(result["moveList"])):
+                yield ("game%d_%03d" % (result["game"], number), position)
+
+
+def readPdnPositions(path):
+    """Yields (name, position) for every position of every game in a PDN file, playing each game
+    through the rules once. A game stops at its first move that is not legal, which is reported"""
+    with open(path) as pdnFile:
+        for gameNumber, parsedGame in enumerate(pdn.readGames(pdnFile)):
+            game = Engine()
+            game.newGame()
+            position = game.getPosition()
+            number = 0
+            yield ("game%d_%03d" % (gameNumber, number), position)
+            moves = parsedGame["moves"]
+            for moveNumber, move in enumerate(moves):
+                played = len(game.getMoveHistory())
+                error = pdn.playMove(game, move, moveNumber == len(moves) - 1)
+                if error != None:
+                    print("game %d stopped at move %d %r, it %s" % (gameNumber, moveNumber + 1, move, error), file=sys.stderr)
+                    break
+                #Each jump of a combo gets its own diagram, worked out on the bitboards alone
+                for xFrom, yFrom, xTo, yTo, taking, whiteMoved in game.getMoveHistory()[played:]:
+                    taken = squareIndex((xFrom + xTo) // 2, (yFrom + yTo) // 2) if taking else None
+                    position = playPositionMove(position, (squareIndex(xFrom, yFrom), squareIndex(xTo, yTo), taken))
+                    number += 1
+                    yield ("game%d_%03d" % (gameNumber, number), position)
+
+
+_workerRenderer = None
+_workerOutputDir = None
+
+def _startWorker(boardSize, outputDir):
+    """Pool initialiser, each worker process keeps one DiagramRenderer for all its images"""
+    global _workerRenderer, _workerOutputDir
+    _workerRenderer = DiagramRenderer(boardSize)
+    _workerOutputDir = outputDir
+
+
+def _renderItem(item):
+    name, position = item
+    _workerRenderer.savePosition(position, os.path.join(_workerOutputDir, name + ".png"))
+    return name
+
+
+def renderBatch(items, outputDir, workers=None, boardSize=BOARD_SIZE, batchSize=4096):
+    """items is an iterable of (name, position), writes outputDir/name.png for each.
+    With more than one of workers the images are drawn on a process pool, items are read in
+    batches of batchSize so a long stream is never all in memory. Returns a summary dict with imagesPerSecond"""
+    if workers == None:
+        workers = os.cpu_count() or 1
+    os.makedirs(outputDir, exist_ok=True)
+    summary = {"images": 0, "workers": workers}
+    startTime = time.perf_counter()
+    if workers == 1:
+        _startWorker(boardSize, outputDir)
+        for item in items:
+            _renderItem(item)
+            summary["images"] += 1
+    else:
+        items = iter(items)
+        with multiprocessing.Pool(workers, _startWorker, (boardSize, outputDir)) as pool:
+            while True:
+                batch = list(itertools.islice(items, batchSize))
+                if batch == []:
+                    break
+                chunksize = max(1, len(batch) // (workers * 4))
+                for name in pool.imap_unordered(_renderItem, batch, chunksize):
+                    summary["images"] += 1
+    elapsed = time.perf_counter() - startTime
+    summary["seconds"] = elapsed
+    summary["imagesPerSecond"] = summary["images"] / elapsed if elapsed > 0 else 0.0
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Draw every position of recorded games to PNG files")
+    parser.add_argument("games", help="PDN file, or selfplay.py --record-moves results if it does not end in .pdn")
+    parser.add_argument("--output-dir", default="diagrams")
+    parser.add_argument("--workers", type=int, default=None, help="processes drawing images, defaults to one per core")
+    args = parser.parse_args()
+    if args.games.endswith(".pdn"):
+        items = readPdnPositions(args.games)
+    else:
+        items = readSelfPlayPositions(args.games)
+    print(json.dumps(renderBatch(items, args.output_dir, args.workers)))
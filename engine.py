@@ -0,0 +1,1077 @@
+"""Headless rules core for checkers, never imports pygame so games can be
+created, played and queried without a display"""
+
+
+BOARD_SIZE = 8
+SQUARE_COUNT = 32
+FULL_MASK = 0xFFFFFFFF
+EVEN_ROWS = 0x0F0F0F0F        #Rows 0,2,4,6, dark squares are on even x
+ODD_ROWS = 0xF0F0F0F0         #Rows 1,3,5,7, dark squares are on odd x
+EVEN_NOT_LEFT = 0x0E0E0E0E    #Even row squares that are not on the x = 0 edge
+ODD_NOT_RIGHT = 0x70707070    #Odd row squares that are not on the x = 7 edge
+TOP_ROW = 0x0000000F          #y = 0, where black pieces are kinged
+BOTTOM_ROW = 0xF0000000       #y = 7, where white pieces are kinged
+
+
+def squareIndex(x, y):
+    """Returns bit index of board coords, None if square is not a playable dark square"""
+    if x < 0 or x >= BOARD_SIZE or y < 0 or y >= BOARD_SIZE or (x + y) % 2 == 1:
+        return None
+    return y * 4 + x // 2
+
+
+def squareCoords(index):
+    """Returns board coords (x, y) of a bit index"""
+    y = index // 4
+    return ((index % 4) * 2 + (y % 2), y)
+
+
+def bitIndices(bits):
+    """Yields indices of set bits, lowest first"""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+#Each shift moves every bit one diagonal step, bits that would leave the board are dropped
+def shiftUpLeft(bits):
+    return (((bits & EVEN_NOT_LEFT) << 3) | ((bits & ODD_ROWS) << 4)) & FULL_MASK
+
+def shiftUpRight(bits):
+    return (((bits & EVEN_ROWS) << 4) | ((bits & ODD_NOT_RIGHT) << 5)) & FULL_MASK
+
+def shiftDownLeft(bits):
+    return ((bits & EVEN_NOT_LEFT) >> 5) | ((bits & ODD_ROWS) >> 4)
+
+def shiftDownRight(bits):
+    return ((bits & EVEN_ROWS) >> 4) | ((bits & ODD_NOT_RIGHT) >> 3)
+
+
+#(shift, inverse shift) pairs, keyed by y direction, left step first like the original checks
+SHIFTS = {1: ((shiftUpLeft, shiftDownRight), (shiftUpRight, shiftDownLeft)),
+          -1: ((shiftDownLeft, shiftUpRight), (shiftDownRight, shiftUpLeft))}
+
+
+def moveableMasks(own, opponent, kings, direction):
+    """own and opponent are bitboards, direction is the y direction own men move in
+    returns (squares that can make a plain move, squares that can take a piece)"""
+    empty = ~(own | opponent) & FULL_MASK
+    ownKings = own & kings
+    stepping = 0
+    taking = 0
+    for shift, inverse in SHIFTS[direction]:
+        stepping |= inverse(empty) & own
+        taking |= inverse(inverse(empty) & opponent) & own
+    if ownKings:
+        for shift, inverse in SHIFTS[-direction]:
+            stepping |= inverse(empty) & ownKings
+            taking |= inverse(inverse(empty) & opponent) & ownKings
+    return (stepping, taking)
+
+
+def countBits(bits):
+    return bin(bits).count("1")
+
+
+def _takingFrom(bits, own, opponent, kings, direction):
+    """Returns the squares in bits that can take a piece"""
+    empty = ~(own | opponent) & FULL_MASK
+    taking = 0
+    for shift, inverse in SHIFTS[direction]:
+        taking |= inverse(inverse(empty) & opponent) & bits
+    if bits & kings:
+        for shift, inverse in SHIFTS[-direction]:
+            taking |= inverse(inverse(empty) & opponent) & bits & kings
+    return taking
+
+
+def _collectMoves(movers, opponent, empty, shifts, moves, taking):
+    """Adds (fromIndex, toIndex, takenIndex) tuples for movers stepping or jumping along shifts"""
+    for shift, inverse in shifts:
+        if taking:
+            for toIndex in bitIndices(shift(shift(movers) & opponent) & empty):
+                takenBit = inverse(1 << toIndex)
+                fromBit = inverse(takenBit)
+                moves.append((fromBit.bit_length() - 1, toIndex, takenBit.bit_length() - 1))
+        else:
+            for toIndex in bitIndices(shift(movers) & empty):
+                fromBit = inverse(1 << toIndex)
+                moves.append((fromBit.bit_length() - 1, toIndex, None))
+
+
+def generateMoves(own, opponent, kings, direction, forcedIndex=None):
+    """Returns list of (fromIndex, toIndex, takenIndex) tuples for the side owning own,
+    takenIndex is None for plain moves. Only taking moves are returned if any exist,
+    forcedIndex limits moves to the piece partway through a combo"""
+    if forcedIndex != None:
+        movers = own & (1 << forcedIndex)
+    else:
+        movers = own
+    empty = ~(own | opponent) & FULL_MASK
+    moves = []
+    _collectMoves(movers, opponent, empty, SHIFTS[direction], moves, True)
+    if movers & kings:
+        _collectMoves(movers & kings, opponent, empty, SHIFTS[-direction], moves, True)
+    if moves or forcedIndex != None:
+        return moves
+    _collectMoves(movers, opponent, empty, SHIFTS[direction], moves, False)
+    if movers & kings:
+        _collectMoves(movers & kings, opponent, empty, SHIFTS[-direction], moves, False)
+    return moves
+
+
+def positionMoves(position, geometry=None):
+    """position is a (white, black, kings, whiteToMove, forcedIndex) tuple as given by
+    Engine.getPosition, returns the moves of the side to move, an empty list means they have lost.
+    geometry is the Geometry of the board the position is on, None for 8x8"""
+    white, black, kings, whiteToMove, forcedIndex = position
+    generate = generateMoves if geometry == None else geometry.generateMoves
+    if whiteToMove:
+        return generate(white, black, kings, 1, forcedIndex)
+    else:
+        return generate(black, white, kings, -1, forcedIndex)
+
+
+def playPositionMove(position, move, geometry=None):
+    """Returns the position after move is played, the same side keeps the turn with
+    forcedIndex set if the moved piece must carry on taking"""
+    white, black, kings, whiteToMove, forcedIndex = position
+    fromIndex, toIndex, takenIndex = move
+    fromBit = 1 << fromIndex
+    toBit = 1 << toIndex
+    if whiteToMove:
+        own, opponent, direction = white, black, 1
+        kingRow = BOTTOM_ROW if geometry == None else geometry.bottomRow
+    else:
+        own, opponent, direction = black, white, -1
+        kingRow = TOP_ROW if geometry == None else geometry.topRow
+    own = (own ^ fromBit) | toBit
+    if kings & fromBit:
+        kings = (kings ^ fromBit) | toBit
+    elif toBit & kingRow:
+        kings |= toBit
+    forcedIndex = None
+    if takenIndex != None:
+        takenBit = 1 << takenIndex
+        opponent &= ~takenBit
+        kings &= ~takenBit
+        if geometry == None:
+            if _takingFrom(toBit, own, opponent, kings, direction):
+                forcedIndex = toIndex
+        elif geometry.generateMoves(own, opponent, kings, direction, toIndex) != []:
+            forcedIndex = toIndex
+    if forcedIndex == None:
+        whiteToMove = not whiteToMove
+    if direction == 1:
+        return (own, opponent, kings, whiteToMove, forcedIndex)
+    else:
+        return (opponent, own, kings, whiteToMove, forcedIndex)
+
+
+def _followJump(board, move, direction, kingRow, path, turns, generate):
+    """board is a [own, opponent, kings] list that the jump is made on and taken back from afterwards,
+    path holds the jumps made so far this turn. Adds every finished turn carrying on from move to turns,
+    generate is the generateMoves function for the board size"""
+    fromIndex, toIndex, takenIndex = move
+    fromBit = 1 << fromIndex
+    toBit = 1 << toIndex
+    takenBit = 1 << takenIndex
+    kingChange = board[2] & takenBit
+    if board[2] & fromBit:
+        kingChange |= fromBit | toBit
+    elif toBit & kingRow:
+        kingChange |= toBit            #Kinged partway through, carries on as a king like _createKings makes it
+    board[0] ^= fromBit | toBit
+    board[1] ^= takenBit
+    board[2] ^= kingChange
+    path.append(move)
+    nextJumps = generate(board[0], board[1], board[2], direction, toIndex)
+    if nextJumps == []:
+        turns.append(tuple(path))
+    for jump in nextJumps:
+        _followJump(board, jump, direction, kingRow, path, turns, generate)
+    path.pop()
+    board[0] ^= fromBit | toBit
+    board[1] ^= takenBit
+    board[2] ^= kingChange
+
+
+def positionTurns(position, geometry=None):
+    """Returns every complete turn of the side to move as a tuple of (fromIndex, toIndex, takenIndex) moves,
+    so a combo is one turn however many jumps it has. If position is partway through a combo the
+    turns finish it. Combos are found depth first on one set of bitboards, without copying positions"""
+    white, black, kings, whiteToMove, forcedIndex = position
+    if geometry == None:
+        generate, topRow, bottomRow = generateMoves, TOP_ROW, BOTTOM_ROW
+    else:
+        generate, topRow, bottomRow = geometry.generateMoves, geometry.topRow, geometry.bottomRow
+    if whiteToMove:
+        board, direction, kingRow = [white, black, kings], 1, bottomRow
+    else:
+        board, direction, kingRow = [black, white, kings], -1, topRow
+    turns = []
+    for move in positionMoves(position, geometry):
+        if move[2] == None:
+            turns.append((move,))
+        else:
+            _followJump(board, move, direction, kingRow, [], turns, generate)
+    return turns
+
+
+def playPositionTurn(position, turn, geometry=None):
+    """Returns the position after every move of turn is played, the other side is then to move"""
+    for move in turn:
+        position = playPositionMove(position, move, geometry)
+    return position
+
+
+#Diagonal steps as (x, y) in table order, up is the direction of increasing y that white men move in
+DIAGONALS = ((-1, 1), (1, 1), (-1, -1), (1, -1))
+FORWARD_DIAGONALS = {1: (0, 1), -1: (2, 3)}   #Keyed by y direction, left step first like SHIFTS
+ALL_DIAGONALS = (0, 1, 2, 3)
+
+
+class Geometry(object):
+    """The squares of one size of board and lookup tables over them, made once per size by getGeometry.
+    Squares are numbered row by row like the 8x8 bitboards, index is y*(size/2) + x//2.
+    neighbours[index][diagonal] is the square one step along a diagonal and landings[index][diagonal]
+    the square two steps along, where a jump over the neighbour lands, None where that is off the board"""
+    __slots__ = ("size", "rowSquares", "squareCount", "fullMask", "topRow", "bottomRow", "startingRows",
+                 "piecesPerSide", "neighbours", "landings", "_coords", "_affected", "_bitboardShifts")
+
+    def __init__(self, size):
+        if size < 4 or size % 2 == 1:
+            raise ValueError("Board size must be an even number of at least 4")
+        self.size = size
+        self.rowSquares = size // 2
+        self.squareCount = size * size // 2
+        self.fullMask = (1 << self.squareCount) - 1
+        self.topRow = (1 << self.rowSquares) - 1                                 #y = 0, where black pieces are kinged
+        self.bottomRow = self.topRow << (self.squareCount - self.rowSquares)    #y = size - 1, where white pieces are kinged
+        self.startingRows = (size - 2) // 2       #Each side starts on all but the middle two rows
+        self.piecesPerSide = self.startingRows * self.rowSquares
+        self._coords = tuple(((index % self.rowSquares) * 2 + (index // self.rowSquares) % 2, index // self.rowSquares)
+                             for index in range(self.squareCount))
+        neighbours = []
+        landings = []
+        affected = []
+        for x, y in self._coords:
+            neighbours.append(tuple(self.squareIndex(x + xStep, y + yStep) for xStep, yStep in DIAGONALS))
+            landings.append(tuple(self.squareIndex(x + 2 * xStep, y + 2 * yStep) for xStep, yStep in DIAGONALS))
+            bits = 1 << self.squareIndex(x, y)
+            for index in neighbours[-1] + landings[-1]:
+                if index != None:
+                    bits |= 1 << index
+            affected.append(bits)
+        self.neighbours = tuple(neighbours)
+        self.landings = tuple(landings)
+        self._affected = tuple(affected)
+        self._bitboardShifts = size == BOARD_SIZE     #The shift functions above are quicker on 8x8
+
+    def squareIndex(self, x, y):
+        """Returns bit index of board coords, None if square is not a playable dark square"""
+        if x < 0 or x >= self.size or y < 0 or y >= self.size or (x + y) % 2 == 1:
+            return None
+        return y * self.rowSquares + x // 2
+
+    def squareCoords(self, index):
+        """Returns board coords (x, y) of a bit index"""
+        return self._coords[index]
+
+    def startingSquares(self, colour):
+        """Returns the bitboard of the squares colour starts on"""
+        rows = (1 << (self.startingRows * self.rowSquares)) - 1
+        if colour == "white":
+            return rows
+        return rows << (self.squareCount - self.startingRows * self.rowSquares)
+
+    def squaresAffectedBy(self, changed):
+        """Returns the squares whose moves can depend on the squares in changed,
+        a piece only looks one and two steps along each diagonal"""
+        affected = 0
+        for index in bitIndices(changed):
+            affected |= self._affected[index]
+        return affected
+
+    def generateMoves(self, own, opponent, kings, direction, forcedIndex=None):
+        """Same as the generateMoves function, for this size of board. Each piece looks its
+        neighbours and landings up, so a move costs the same however big the board is"""
+        if self._bitboardShifts:
+            return generateMoves(own, opponent, kings, direction, forcedIndex)
+        if forcedIndex != None:
+            movers = own & (1 << forcedIndex)
+        else:
+            movers = own
+        occupied = own | opponent
+        forward = FORWARD_DIAGONALS[direction]
+        jumps = []
+        steps = []
+        for fromIndex in bitIndices(movers):
+            neighbours = self.neighbours[fromIndex]
+            for diagonal in (ALL_DIAGONALS if (kings >> fromIndex) & 1 else forward):
+                target = neighbours[diagonal]
+                if target == None:
+                    continue
+                if not (occupied >> target) & 1:
+                    steps.append((fromIndex, target, None))
+                elif (opponent >> target) & 1:
+                    landing = self.landings[fromIndex][diagonal]
+                    if landing != None and not (occupied >> landing) & 1:
+                        jumps.append((fromIndex, landing, target))
+        if jumps or forcedIndex != None:
+            return jumps
+        return steps
+
+
+_geometries = {}
+
+def getGeometry(size=BOARD_SIZE):
+    """Returns the Geometry of a size by size board, the tables are only worked out the first time"""
+    if size not in _geometries:
+        _geometries[size] = Geometry(size)
+    return _geometries[size]
+
+
+NO_SQUARE = 0xFF             #Selected square byte of a snapshot with nothing selected
+WINNERS = (None, "white", "black")
+
+
+class Snapshot(object):
+    """The whole state of a game packed into a few bytes, 15 on 8x8. The bytes are the board size,
+    a flags byte, the selected square, then the white, black and kings bitboards little endian.
+    Flags are the side to move in bit 0, a forced combo in bit 1 and the winner in bits 2 and 3.
+    Snapshots never change, equal states give equal bytes so they can be compared and hashed"""
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        """data is bytes from toBytes, ValueError if they are not a snapshot"""
+        data = bytes(data)
+        if (len(data) < 3 or data[0] < 4 or data[0] % 2 == 1 or len(data) != 3 + 3 * _maskBytes(data[0]) or
+                data[1] >> 4 or (data[1] >> 2) & 3 == 3 or (data[2] != NO_SQUARE and data[2] >= data[0] * data[0] // 2)):
+            raise ValueError("Not a game snapshot")
+        self._data = data
+        size, white, black, kings, whiteToMove, selectedIndex, selectedForced, winner = self.getState()
+        geometry = getGeometry(size)
+        if white & black or (white | black) & ~geometry.fullMask or kings & ~(white | black):
+            raise ValueError("Snapshot has pieces off the board or on top of each other")
+        if white & ~kings & geometry.bottomRow or black & ~kings & geometry.topRow:
+            raise ValueError("Snapshot has men on the row they are kinged on")
+        if selectedForced and (selectedIndex == None or not ((white if whiteToMove else black) >> selectedIndex) & 1):
+            raise ValueError("Snapshot has a forced combo without a piece of the side to move on its square")
+
+    @staticmethod
+    def pack(size, white, black, kings, whiteToMove, selectedIndex=None, selectedForced=False, winner=None):
+        """winner is None, 'white' or 'black', selectedIndex None when nothing is selected"""
+        maskBytes = _maskBytes(size)
+        flags = int(whiteToMove) | (int(selectedForced) << 1) | (WINNERS.index(winner) << 2)
+        return Snapshot(bytes((size, flags, NO_SQUARE if selectedIndex == None else selectedIndex)) +
+                        white.to_bytes(maskBytes, "little") + black.to_bytes(maskBytes, "little") +
+                        kings.to_bytes(maskBytes, "little"))
+
+    def getState(self):
+        """Returns (size, white, black, kings, whiteToMove, selectedIndex, selectedForced, winner)"""
+        data = self._data
+        maskBytes = _maskBytes(data[0])
+        masks = [int.from_bytes(data[3 + i * maskBytes:3 + (i + 1) * maskBytes], "little") for i in range(3)]
+        return (data[0], masks[0], masks[1], masks[2], bool(data[1] & 1), None if data[2] == NO_SQUARE else data[2],
+                bool(data[1] & 2), WINNERS[(data[1] >> 2) & 3])
+
+    def getPosition(self):
+        """Returns the (white, black, kings, whiteToMove, forcedIndex) tuple, as Engine.getPosition"""
+        size, white, black, kings, whiteToMove, selectedIndex, selectedForced, winner = self.getState()
+        return (white, black, kings, whiteToMove, selectedIndex if selectedForced else None)
+
+    def getBoardSize(self):
+        return self._data[0]
+
+    def toBytes(self):
+        return self._data
+
+    def __eq__(self, other):
+        return isinstance(other, Snapshot) and self._data == other._data
+
+    def __hash__(self):
+        return hash(self._data)
+
+    def __repr__(self):
+        return "Snapshot(" + repr(self._data) + ")"
+
+
+def _maskBytes(size):
+    return (size * size // 2 + 7) // 8
+
+
+class Piece(object):
+    __slots__ = ("_direction", "_colour", "_kinged", "_owner", "_slot")
+
+    def __init__(self, colour):
+        """movementDirection is an int that shows y direction piece moves in
+        colour is a string, must be either 'black' or 'white'"""
+        if colour == "white":
+            self._direction = 1
+        else:
+            self._direction = -1
+        self._colour = colour
+        self._kinged = False
+        self._owner = None
+        self._slot = None      #Position in the owner's piece list, None when not in play
+
+    def getDirection(self):
+        return self._direction
+
+    def getColour(self):
+        """returns colour which is a string"""
+        return self._colour
+
+    def getKinged(self):
+        return self._kinged
+
+    def setKinged(self, kinged=True):
+        """kinged is False only when a move is being undone"""
+        if kinged != self._kinged and self._slot != None:
+            self._owner._changeKings(1 if kinged else -1)
+        self._kinged = kinged
+
+    def getOwner(self):
+        return self._owner
+
+    def setOwner(self, player):
+        """player is a player object"""
+        self._owner = player
+
+
+class Player(object):
+    """Keeps its pieces in play along with counts of kings and captured pieces,
+    adding and removing a piece takes the same time however many there are"""
+    __slots__ = ("_pieces", "_name", "_kings", "_captured")
+
+    def __init__(self, name):
+        self._pieces = []
+        self._name = name
+        self._kings = 0
+        self._captured = 0
+
+    def addPiece(self, piece):
+        """piece is a piece object, adding back a piece of this player's that was removed uncaptures it"""
+        if piece.getOwner() is self and piece._slot == None:
+            self._captured -= 1
+        piece.setOwner(self)
+        piece._slot = len(self._pieces)
+        self._pieces.append(piece)
+        if piece.getKinged():
+            self._kings += 1
+
+    def removePiece(self, piece):
+        """piece is a piece object, counts as captured until it is added back"""
+        last = self._pieces.pop()
+        if last is not piece:          #Fill the gap with the last piece rather than shuffling the list along
+            self._pieces[piece._slot] = last
+            last._slot = piece._slot
+        piece._slot = None
+        if piece.getKinged():
+            self._kings -= 1
+        self._captured += 1
+
+    def clearPieces(self):
+        """Takes every piece out of play and resets the counts, for starting a new game"""
+        for piece in self._pieces:
+            piece._slot = None
+            piece.setOwner(None)
+        self._pieces = []
+        self._kings = 0
+        self._captured = 0
+
+    def _changeKings(self, change):
+        self._kings += change
+
+    def getPieces(self):
+        return self._pieces.copy()
+
+    def getPieceCount(self):
+        return len(self._pieces)
+
+    def getKingCount(self):
+        return self._kings
+
+    def getCapturedCount(self):
+        """Pieces removed since the pieces were last cleared that have not been added back"""
+        return self._captured
+
+    def getName(self):
+        return self._name
+
+class Board(object):
+    """Stores the pieces as bitboards over the playable dark squares, 32 of them on 8x8.
+    Square index is y*4 + x//2 on 8x8, so bits run in the same order as a row by row scan.
+    Piece objects are kept alongside the masks so getPiece still hands them out"""
+    __slots__ = ("_white", "_black", "_kings", "_squares", "_geometry")
+
+    def __init__(self, size=BOARD_SIZE):
+        self._geometry = getGeometry(size)
+        self._white = 0
+        self._black = 0
+        self._kings = 0
+        self._squares = [None] * self._geometry.squareCount
+
+    def getSize(self):
+        return self._geometry.size
+
+    def getBoard(self):
+        """returns copy of board, so can not be editted"""
+        size = self._geometry.size
+        board = [[None] * size for row in range(size)]
+        for index in range(self._geometry.squareCount):
+            x, y = self._geometry.squareCoords(index)
+            board[y][x] = self._squares[index]
+        return board
+
+    def getMasks(self):
+        """returns tuple of (white, black, kings) bitboards"""
+        return (self._white, self._black, self._kings)
+
+    def getColourMasks(self, colour):
+        """colour is 'white' or 'black', returns (own, opponent, kings) bitboards"""
+        if colour == "white":
+            return (self._white, self._black, self._kings)
+        else:
+            return (self._black, self._white, self._kings)
+
+    def getPieceAtIndex(self, index):
+        return self._squares[index]
+
+    def removePiece(self, x, y):
+        """x and y are ints representing coords"""
+        index = self._geometry.squareIndex(x, y)
+        if index == None:
+            return None
+        clear = ~(1 << index)
+        self._white &= clear
+        self._black &= clear
+        self._kings &= clear
+        self._squares[index] = None
+
+    def addPiece(self, x, y, piece):
+        """x and y are ints, piece is a piece object"""
+        index = self._geometry.squareIndex(x, y)
+        if index == None:
+            raise ValueError("Pieces can only be placed on dark squares")
+        self.removePiece(x, y)
+        if piece == None:
+            return None
+        bit = 1 << index
+        if piece.getColour() == "white":
+            self._white |= bit
+        else:
+            self._black |= bit
+        if piece.getKinged():
+            self._kings |= bit
+        self._squares[index] = piece
+
+    def getPiece(self, x, y):
+        index = self._geometry.squareIndex(x, y)
+        if index == None:
+            return None
+        return self._squares[index]
+
+    def movePiece(self, oldx, oldy, newx, newy):
+        """Moves a piece"""
+        piece = self.getPiece(oldx,oldy)
+        self.removePiece(oldx, oldy)
+        self.addPiece(newx, newy, piece)
+
+    def createKing(self, x, y):
+        piece = self.getPiece(x, y)
+        if piece != None:
+            piece.setKinged()
+            self._kings |= 1 << self._geometry.squareIndex(x, y)
+
+    def setSquares(self, white, black, kings, squares):
+        """Replaces everything on the board at once, squares is a list of the piece on each square index
+        that must agree with the white, black and kings bitboards"""
+        self._white = white
+        self._black = black
+        self._kings = kings
+        self._squares = squares
+
+    def resetBoard(self):
+        self._white = 0
+        self._black = 0
+        self._kings = 0
+        self._squares = [None] * self._geometry.squareCount
+
+class Engine(object):
+    """Holds the state and rules of one game, Engine must be initialised before moves are made"""
+    __slots__ = ("_board", "_player1", "_player2", "_whosTurn", "_selected", "_piecesWithMoves", "_selectedForced",
+                 "_winner", "_pieceMoves", "_steppingSquares", "_takingSquares", "_moveableSquares", "_moveHistory",
+                 "_geometry")
+
+    def __init__(self, size=BOARD_SIZE):
+        """size is the width and height of the board, an even number such as 8, 10 or 12"""
+        self._geometry = getGeometry(size)
+        self._board = Board(size)
+        self._player1 = Player("White")
+        self._player2 = Player("Black")
+        self._whosTurn = self._player1
+        self._selected = (None, None)  #Will be this when nothing selected
+        self._piecesWithMoves = []     #Will contain pieces the player can move on their turn
+        self._selectedForced = False   #Used for combo taking
+        self._winner = None
+        self._pieceMoves = [()] * self._geometry.squareCount   #Cached _checkPossibleMoves result for each square
+        self._steppingSquares = 0      #Squares holding a piece that can only make plain moves
+        self._takingSquares = 0        #Squares holding a piece that can take
+        self._moveableSquares = 0      #Squares of _piecesWithMoves
+        self._moveHistory = []         #Every move made, as (xFrom, yFrom, xTo, yTo, taking, whiteMoved)
+
+
+    def _setUpPlayer1(self):
+        self._player1.clearPieces()
+        for index in bitIndices(self._geometry.startingSquares("white")):
+            piece = Piece("white")
+            self._player1.addPiece(piece)
+            self._board.addPiece(*self._geometry.squareCoords(index), piece)
+       
+
+    def _setUpPlayer2(self):
+        self._player2.clearPieces()
+        for index in bitIndices(self._geometry.startingSquares("black")):
+            piece = Piece("black")
+            self._player2.addPiece(piece)
+            self._board.addPiece(*self._geometry.squareCoords(index), piece)
+
+
+    def _swapTurn(self):
+        if self._whosTurn == self._player1:
+            self._whosTurn = self._player2
+        else:
+            self._whosTurn = self._player1
+
+
+    def _setSelected(self, xBoard, yBoard):
+        """Sets selected tile, selected is a tuple"""      
+        self._selected = (xBoard, yBoard)
+        
+            
+
+    def _getSelected(self):
+        return self._selected
+
+    def _deselect(self):
+        """Resets selection"""
+        self._setSelected(None,None)
+        self._selectedForced = False
+
+    def _isSelected(self):
+        """Checks if nothing is selected"""
+        if self._getSelected() == (None, None):
+            return False
+        else:
+            return True
+
+
+    def _checkPossibleMovesWithDirection(self, xBoard, yBoard, yDirection):
+        """The only purpose of this is to be used in the _checkPossibleMoves function
+           so I dont have to type it twice for kinged pieces"""
+        currentPiece = self._board.getPiece(xBoard, yBoard)
+        if currentPiece == None:
+            return None
+        own, opponent, kings = self._board.getColourMasks(currentPiece.getColour())
+        occupied = own | opponent
+        geometry = self._geometry
+        index = geometry.squareIndex(xBoard, yBoard)
+        availableMoves = []
+        for diagonal in FORWARD_DIAGONALS[yDirection]:    #Forward+left then forward+right
+            target = geometry.neighbours[index][diagonal]
+            if target == None:
+                continue
+            if not (occupied >> target) & 1:
+                availableMoves.append(geometry.squareCoords(target) + (False,))
+            elif (opponent >> target) & 1:
+                landing = geometry.landings[index][diagonal]
+                if landing != None and not (occupied >> landing) & 1:
+                    availableMoves.append(geometry.squareCoords(landing) + (True,))
+        return availableMoves
+
+
+    def _checkPossibleMoves(self, xBoard, yBoard):
+        """Returns a list of tuples which contain coords of possible moves of a
+        piece positioned at input coords, tuple will also have 3rd bool value
+        which says if piece was jumped over. Answered from the move cache"""
+        index = self._geometry.squareIndex(xBoard, yBoard)
+        if index == None:
+            return []
+        return list(self._pieceMoves[index])
+
+
+    def _calculatePossibleMoves(self, xBoard, yBoard):
+        """Works out _checkPossibleMoves from the board, used to fill the move cache"""
+        currentPiece = self._board.getPiece(xBoard, yBoard)
+        if currentPiece == None:
+            return []
+        direction = currentPiece.getDirection()
+        availableMoves = self._checkPossibleMovesWithDirection(xBoard, yBoard, direction)
+        if currentPiece.getKinged():
+            extraMoves = self._checkPossibleMovesWithDirection(xBoard, yBoard, -direction)
+            for move in extraMoves:
+                availableMoves.append(move)
+        #Remove moves where piece not taken if possible to take one
+        canTake = False
+        for move in availableMoves:
+            if move[2] == True:
+                canTake = True
+                break
+        if canTake:
+            availableMovesCopy = availableMoves.copy()
+            for move in availableMovesCopy:
+                if move[2] != True :
+                    availableMoves.remove(move)
+        return availableMoves
+
+
+    def _checkActualMoves(self, xBoard, yBoard):
+        """Used to see what moves a player can take with a piece"""
+        index = self._geometry.squareIndex(xBoard, yBoard)
+        if index == None or not self._moveableSquares & (1 << index):
+            return []
+        else:
+            return self._checkPossibleMoves(xBoard, yBoard)
+                  
+        
+    def _movePiece(self, xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking):
+        """taking is a bool that says if a piece is being taken in this move
+        returns an undo record that _unmovePiece can use to take the move back"""
+        record = (xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, None, None,
+                  self._board.getPiece(xBoardOrig, yBoardOrig).getKinged(), self._whosTurn, self._selected,
+                  self._selectedForced, self._winner, self._piecesWithMoves, self._moveableSquares)
+        self._moveHistory.append((xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking, self._whosTurn == self._player1))
+        changed = (1 << self._geometry.squareIndex(xBoardOrig, yBoardOrig)) | (1 << self._geometry.squareIndex(xBoardAfter, yBoardAfter))
+        if not taking:
+            self._board.movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter)
+            self._refreshMoves(self._geometry.squaresAffectedBy(changed))
+            self._createKings()
+            self._startNewTurn()
+        elif taking:
+            if xBoardAfter < xBoardOrig:
+                xSkew = -1
+            else:
+                xSkew = 1
+            if yBoardAfter < yBoardOrig:
+                ySkew = -1
+            else:
+                ySkew = 1
+            toRemovePiece = self._board.getPiece(xBoardOrig+xSkew, yBoardOrig+ySkew)
+            record = record[:4] + (toRemovePiece, (xBoardOrig+xSkew, yBoardOrig+ySkew)) + record[6:]
+            toRemovePiece.getOwner().removePiece(toRemovePiece)
+            self._board.removePiece(xBoardOrig+xSkew,yBoardOrig+ySkew)
+            self._board.movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter)
+            changed |= 1 << self._geometry.squareIndex(xBoardOrig+xSkew, yBoardOrig+ySkew)
+            self._refreshMoves(self._geometry.squaresAffectedBy(changed))
+            self._createKings()
+            newAvailable = self._checkPossibleMoves(xBoardAfter, yBoardAfter)
+            if newAvailable == [] or newAvailable[0][2] == False:
+                self._startNewTurn()
+            else:
+                self._setSelected(xBoardAfter, yBoardAfter)
+                self._selectedForced = True
+                self._moveableSquares &= ~(1 << self._geometry.squareIndex(xBoardOrig, yBoardOrig))
+                self._moveableSquares |= 1 << self._geometry.squareIndex(xBoardAfter, yBoardAfter)
+        return record
+
+
+    def _unmovePiece(self, record):
+        """record is an undo record from _movePiece, puts the game back how it was before that move.
+        Records must be undone in the reverse order they were made"""
+        (xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, takenPiece, takenCoords, wasKinged,
+         self._whosTurn, self._selected, self._selectedForced, self._winner,
+         self._piecesWithMoves, self._moveableSquares) = record
+        self._moveHistory.pop()
+        piece = self._board.getPiece(xBoardAfter, yBoardAfter)
+        piece.setKinged(wasKinged)
+        self._board.movePiece(xBoardAfter, yBoardAfter, xBoardOrig, yBoardOrig)
+        changed = (1 << self._geometry.squareIndex(xBoardOrig, yBoardOrig)) | (1 << self._geometry.squareIndex(xBoardAfter, yBoardAfter))
+        if takenPiece != None:
+            takenPiece.getOwner().addPiece(takenPiece)
+            self._board.addPiece(takenCoords[0], takenCoords[1], takenPiece)
+            changed |= 1 << self._geometry.squareIndex(takenCoords[0], takenCoords[1])
+        self._refreshMoves(self._geometry.squaresAffectedBy(changed))
+
+
+    def _createKings(self):
+        """Kings any black piece on the top row and any white piece on the bottom row"""
+        white, black, kings = self._board.getMasks()
+        newKings = ((black & self._geometry.topRow) | (white & self._geometry.bottomRow)) & ~kings
+        for index in bitIndices(newKings):
+            x, y = self._geometry.squareCoords(index)
+            self._board.createKing(x, y)
+        if newKings:
+            self._refreshMoves(newKings)
+
+
+    def _refreshMoves(self, squares):
+        """squares is a bitboard, works out the cached moves again for just those squares"""
+        white, black, kings = self._board.getMasks()
+        occupied = white | black
+        stepping = self._steppingSquares & ~squares
+        taking = self._takingSquares & ~squares
+        for index in bitIndices(squares):
+            if occupied & (1 << index):
+                moves = tuple(self._calculatePossibleMoves(*self._geometry.squareCoords(index)))
+            else:
+                moves = ()
+            self._pieceMoves[index] = moves
+            if moves:
+                if moves[0][2]:
+                    taking |= 1 << index
+                else:
+                    stepping |= 1 << index
+        self._steppingSquares = stepping
+        self._takingSquares = taking
+
+
+    def _findMoveableSquares(self, player):
+        """Player is player object, returns bitboard of squares of moveable pieces"""
+        if player == self._player1:
+            colour = "white"
+        else:
+            colour = "black"
+        own, opponent, kings = self._board.getColourMasks(colour)
+        moveable = self._takingSquares & own
+        if not moveable:                   #Taking is forced, so only pieces that can take may move
+            moveable = self._steppingSquares & own
+        return moveable
+
+
+    def _findMoveablePieces(self, player):
+        """Player is player object, returns list of moveavble pieces"""
+        moveable = self._findMoveableSquares(player)
+        return [self._board.getPieceAtIndex(index) for index in bitIndices(moveable)]
+
+
+    def _setUpTurn(self):
+        self._moveableSquares = self._findMoveableSquares(self._whosTurn)
+        moveablePieces = [self._board.getPieceAtIndex(index) for index in bitIndices(self._moveableSquares)]
+        self._piecesWithMoves = moveablePieces
+        if self._piecesWithMoves == []:
+            if self._whosTurn == self._player1:
+                self._winner = self._player2
+            elif self._whosTurn == self._player2:
+                self._winner = self._player1
+             
+
+    def _startNewTurn(self):
+        """This swaps the players and sets up values for a new turn"""
+        self._deselect()
+        self._swapTurn()
+        self._setUpTurn()
+
+
+    def _initialise(self):
+        self._board.resetBoard()
+        self._whosTurn = self._player1
+        self._selected = (None, None) 
+        self._piecesWithMoves = []     
+        self._selectedForced = False
+        self._winner = None
+        self._moveHistory = []
+        self._setUpPlayer1()
+        self._setUpPlayer2()
+        self._refreshMoves(self._geometry.fullMask)
+        self._setUpTurn()
+                 
+
+    def getBoard(self):
+        return self._board
+
+
+    def getGeometry(self):
+        """Returns the Geometry of the board the game is played on"""
+        return self._geometry
+
+
+    def setPosition(self, position):
+        """Sets the game up from a (white, black, kings, whiteToMove, forcedIndex) tuple
+        like getPosition returns, the move history starts again from here"""
+        self._loadPosition(position, None)
+
+
+    def _loadPosition(self, position, movesFrom):
+        """movesFrom is None, or an Engine in the same position whose move cache is copied
+        instead of being worked out again"""
+        white, black, kings, whiteToMove, forcedIndex = position
+        squares = [None] * self._geometry.squareCount
+        for player, colour, bits in ((self._player1, "white", white), (self._player2, "black", black)):
+            player.clearPieces()
+            for index in bitIndices(bits):
+                piece = Piece(colour)
+                if (kings >> index) & 1:
+                    piece.setKinged()
+                player.addPiece(piece)
+                squares[index] = piece
+        self._board.setSquares(white, black, kings & (white | black), squares)
+        if whiteToMove:
+            self._whosTurn = self._player1
+        else:
+            self._whosTurn = self._player2
+        self._selected = (None, None)
+        self._selectedForced = False
+        self._winner = None
+        self._moveHistory = []
+        if movesFrom == None:
+            self._refreshMoves(self._geometry.fullMask)
+        else:
+            self._pieceMoves = list(movesFrom._pieceMoves)
+            self._steppingSquares = movesFrom._steppingSquares
+            self._takingSquares = movesFrom._takingSquares
+        self._setUpTurn()
+        if forcedIndex != None:
+            self._setSelected(*self._geometry.squareCoords(forcedIndex))
+            self._selectedForced = True
+            self._moveableSquares = 1 << forcedIndex
+            self._piecesWithMoves = [self._board.getPieceAtIndex(forcedIndex)]
+
+
+    def getSnapshot(self):
+        """Returns a Snapshot of the board, turn, selection, forced combo and winner, not the move history"""
+        white, black, kings = self._board.getMasks()
+        selectedIndex = None
+        if self._isSelected():
+            selectedIndex = self._geometry.squareIndex(*self._getSelected())
+        winner = None
+        if self._winner != None:
+            winner = "white" if self._winner == self._player1 else "black"
+        return Snapshot.pack(self._geometry.size, white, black, kings, self._whosTurn == self._player1,
+                             selectedIndex, self._selectedForced, winner)
+
+
+    def setSnapshot(self, snapshot):
+        """Puts the game in the state of a Snapshot from a board of the same size,
+        the move history starts again from here"""
+        self._loadSnapshot(snapshot, None)
+
+
+    def _loadSnapshot(self, snapshot, movesFrom):
+        if snapshot.getBoardSize() != self._geometry.size:
+            raise ValueError("Snapshot is of a %dx%d board" % (snapshot.getBoardSize(), snapshot.getBoardSize()))
+        size, white, black, kings, whiteToMove, selectedIndex, selectedForced, winner = snapshot.getState()
+        self._loadPosition(snapshot.getPosition(), movesFrom)
+        if selectedIndex != None and not selectedForced:
+            self._setSelected(*self._geometry.squareCoords(selectedIndex))
+        self._winner = {None: None, "white": self._player1, "black": self._player2}[winner]
+
+
+    def toBytes(self):
+        """Returns the game state packed as in Snapshot, for saving or sending"""
+        return self.getSnapshot().toBytes()
+
+
+    def loadBytes(self, data):
+        """Puts the game in the state packed in data by toBytes"""
+        self.setSnapshot(Snapshot(data))
+
+
+    @staticmethod
+    def fromBytes(data):
+        """Returns a new Engine in the state packed in data by toBytes"""
+        snapshot = Snapshot(data)
+        engine = Engine(snapshot.getBoardSize())
+        engine.setSnapshot(snapshot)
+        return engine
+
+
+    def clone(self):
+        """Returns a new Engine in the same state, without the move history.
+        Made from a snapshot, with the move cache copied rather than worked out again"""
+        engine = Engine(self._geometry.size)
+        engine._loadSnapshot(self.getSnapshot(), self)
+        return engine
+
+
+    def getPosition(self):
+        """Returns the game state as a (white, black, kings, whiteToMove, forcedIndex) tuple,
+        forcedIndex is the square of a piece that must carry on taking, otherwise None"""
+        white, black, kings = self._board.getMasks()
+        forcedIndex = None
+        if self._selectedForced:
+            forcedIndex = self._geometry.squareIndex(*self._getSelected())
+        return (white, black, kings, self._whosTurn == self._player1, forcedIndex)
+
+
+    def getPlayers(self):
+        """returns tuple of (white player, black player)"""
+        return (self._player1, self._player2)
+
+
+    def getTurn(self):
+        """returns the player object whos turn it is"""
+        return self._whosTurn
+
+
+    def getWinner(self):
+        return self._winner
+
+
+    def getMoveHistory(self):
+        """Returns list of every move made this game as (xFrom, yFrom, xTo, yTo, taking, whiteMoved),
+        each jump of a combo is a separate entry"""
+        return list(self._moveHistory)
+
+
+    def newGame(self):
+        self._initialise()
+
+
+    def getLegalMoves(self):
+        """Returns list of tuples (xFrom, yFrom, xTo, yTo, taking) the player to move can make"""
+        if self._winner != None:
+            return []
+        if self._selectedForced:
+            origins = [self._getSelected()]
+        else:
+            origins = [self._geometry.squareCoords(index) for index in bitIndices(self._moveableSquares)]
+        legalMoves = []
+        for xBoard, yBoard in origins:
+            for move in self._checkActualMoves(xBoard, yBoard):
+                legalMoves.append((xBoard, yBoard) + move)
+        return legalMoves
+
+
+    def getLegalTurns(self):
+        """Returns list of complete turns the player to move can make, each a tuple of
+        (xFrom, yFrom, xTo, yTo, taking) moves with every jump of a combo in order"""
+        if self._winner != None:
+            return []
+        legalTurns = []
+        for turn in positionTurns(self.getPosition(), self._geometry):
+            legalTurns.append(tuple(self._geometry.squareCoords(fromIndex) + self._geometry.squareCoords(toIndex) + (takenIndex != None,)
+                                    for fromIndex, toIndex, takenIndex in turn))
+        return legalTurns
+
+
+    def makeTurn(self, turn):
+        """Plays a whole turn from getLegalTurns, returns the list of undo records for unmakeTurn,
+        or None if it is not a legal turn"""
+        turn = tuple(tuple(move) for move in turn)
+        if turn not in self.getLegalTurns():
+            return None
+        return [self._movePiece(*move) for move in turn]
+
+
+    def unmakeTurn(self, records):
+        """Takes back a turn played with makeTurn"""
+        for record in reversed(records):
+            self._unmovePiece(record)
+
+
+    def makeMove(self, xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter):
+        """Plays a move if it is legal, returns an undo record for unmakeMove, or None if the move is not legal.
+        The record holds the moved and taken squares, the taken piece, the moved piece's king status
+        and the turn, selection, forced combo and winner from before the move"""
+        for move in self.getLegalMoves():
+            if move[:4] == (xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter):
+                return self._movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, move[4])
+        return None
+
+
+    def unmakeMove(self, record):
+        """Takes back the move record came from, the last move made must be taken back first"""
+        self._unmovePiece(record)
@@ -0,0 +1,146 @@
+"""Opt-in timing of the game loop. Methods are timed by swapping a timed wrapper onto the object
+they belong to, so nothing is added to any call unless instruments have been attached"""
+import collections, csv, json, os, time
+
+
+class Histogram(object):
+    """Keeps the last size samples in a ring buffer, percentiles are only worked out when asked for"""
+    def __init__(self, size=1024):
+        self._samples = [0.0] * size
+        self._next = 0
+        self.count = 0
+
+
+    def record(self, seconds):
+        self._samples[self._next] = seconds
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+
+
+    def getSummary(self):
+        """Returns dict of call count and mean, p50, p95, p99 and max milliseconds over the samples kept"""
+        samples = sorted(self._samples[:min(self.count, len(self._samples))])
+        if samples == []:
+            return {"count": 0, "meanMs": 0.0, "p50Ms": 0.0, "p95Ms": 0.0, "p99Ms": 0.0, "maxMs": 0.0}
+        last = len(samples) - 1
+        return {"count": self.count,
+                "meanMs": sum(samples) / len(samples) * 1000,
+                "p50Ms": samples[int(last * 0.5)] * 1000,
+                "p95Ms": samples[int(last * 0.95)] * 1000,
+                "p99Ms": samples[int(last * 0.99)] * 1000,
+                "maxMs": samples[last] * 1000}
+
+
+
+class Instruments(object):
+    """Latency histograms for named stages and the frame rate of the loop.
+    If dumpPath is given a snapshot is added to it every dumpInterval seconds, as CSV rows if
+    it ends in .csv and otherwise as one JSON object per line"""
+    def __init__(self, dumpPath=None, dumpInterval=10.0, histogramSize=1024, overlayInterval=0.5):
+        self._histograms = {}
+        self._histogramSize = histogramSize
+        self._frameEnds = collections.deque(maxlen=120)
+        self._frameStart = None
+        self._idleStart = None
+        self._idle = 0.0
+        self.dumpPath = dumpPath
+        self.dumpInterval = dumpInterval
+        self._lastDump = time.perf_counter()
+        self.overlayInterval = overlayInterval
+        self._overlayLines = []
+        self._lastOverlay = None
+
+
+    def getHistogram(self, name):
+        if name not in self._histograms:
+            self._histograms[name] = Histogram(self._histogramSize)
+        return self._histograms[name]
+
+
+    def wrap(self, owner, methodName, name=None):
+        """Replaces owner.methodName with a wrapper that times every call to it,
+        name is what the stage is reported as and defaults to methodName"""
+        method = getattr(owner, methodName)
+        histogram = self.getHistogram(name or methodName)
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.record(clock() - start)
+
+        setattr(owner, methodName, timed)
+
+
+    def startFrame(self):
+        self._frameStart = time.perf_counter()
+        self._idle = 0.0
+
+
+    def startIdle(self):
+        """Time between startIdle and endIdle, such as waiting for events, is left out of the frame time"""
+        self._idleStart = time.perf_counter()
+
+
+    def endIdle(self):
+        self._idle += time.perf_counter() - self._idleStart
+
+
+    def endFrame(self):
+        """Records the frame time and dumps a snapshot if one is due"""
+        now = time.perf_counter()
+        if self._frameStart != None:
+            self.getHistogram("frame").record(now - self._frameStart - self._idle)
+        self._frameEnds.append(now)
+        if self.dumpPath != None and now - self._lastDump >= self.dumpInterval:
+            self.dump()
+
+
+    def getFramesPerSecond(self):
+        """Frames a second over the last 120 frames"""
+        if len(self._frameEnds) < 2:
+            return 0.0
+        elapsed = self._frameEnds[-1] - self._frameEnds[0]
+        if elapsed <= 0:
+            return 0.0
+        return (len(self._frameEnds) - 1) / elapsed
+
+
+    def getSnapshot(self):
+        return {"time": time.time(), "framesPerSecond": self.getFramesPerSecond(),
+                "stages": dict((name, histogram.getSummary()) for name, histogram in self._histograms.items())}
+
+
+    def getOverlayLines(self):
+        """Returns lines of text describing the stages, only worked out again every overlayInterval seconds"""
+        now = time.perf_counter()
+        if self._lastOverlay == None or now - self._lastOverlay >= self.overlayInterval:
+            self._lastOverlay = now
+            lines = ["fps %.1f   p50/p95/p99 ms" % self.getFramesPerSecond()]
+            for name, histogram in sorted(self._histograms.items()):
+                summary = histogram.getSummary()
+                lines.append("%s %d %.2f/%.2f/%.2f" % (name, summary["count"], summary["p50Ms"], summary["p95Ms"], summary["p99Ms"]))
+            self._overlayLines = lines
+        return self._overlayLines
+
+
+    def dump(self, path=None):
+        """Adds a snapshot to path, or dumpPath if path is None"""
+        if path == None:
+            path = self.dumpPath
+        self._lastDump = time.perf_counter()
+        snapshot = self.getSnapshot()
+        if path.endswith(".csv"):
+            writeHeader = not os.path.exists(path) or os.path.getsize(path) == 0
+            with open(path, "a", newline="") as dumpFile:
+                writer = csv.writer(dumpFile)
+                if writeHeader:
+                    writer.writerow(["time", "framesPerSecond", "stage", "count", "meanMs", "p50Ms", "p95Ms", "p99Ms", "maxMs"])
+                for name, summary in sorted(snapshot["stages"].items()):
+                    writer.writerow([snapshot["time"], snapshot["framesPerSecond"], name, summary["count"], summary["meanMs"],
+                                     summary["p50Ms"], summary["p95Ms"], summary["p99Ms"], summary["maxMs"]])
+        else:
+            with open(path, "a") as dumpFile:
+                dumpFile.write(json.dumps(snapshot) + "\n")
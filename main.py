@@ -1,175 +1,51 @@
-import pygame, sys
+import pygame, sys, argparse
+from engine import Engine, Snapshot, BOARD_SIZE, getGeometry
+from worker import SearchWorker
+from instruments import Instruments
+import pdn
 
 
 
-class Piece(object):
-    def __init__(self, colour):
-        """movementDirection is an int that shows y direction piece moves in
-        colour is a string, must be either 'black' or 'white'"""
-        if colour == "white":
-            self._direction = 1
-        else:
-            self._direction = -1
-        self._colour = colour
-        self._kinged = False
-        self._owner = None
-
-    def getDirection(self):
-        return self._direction
-
-    def getColour(self):
-        """returns colour which is a string"""
-        return self._colour
-
-    def getKinged(self):
-        return self._kinged
-
-    def setKinged(self):
-        self._kinged = True
-
-    def getOwner(self):
-        return self._owner
-
-    def setOwner(self, player):
-        """player is a player object"""
-        self._owner = player
-
-
-class Player(object):
-    def __init__(self, name):
-        self._pieces = []
-        self._name = name
-
-    def addPiece(self, piece):
-        """piece is a piece object"""
-        piece.setOwner(self)
-        self._pieces.append(piece)
-
-    def removePiece(self, piece):
-        """piece is a piece object"""
-        self._pieces.remove(piece)
-
-    def getPieces(self):
-        return self._pieces.copy()
-
-    def getName(self):
-        return self._name
-
-class Board(object):
-    def __init__(self):
-        self._board = [[None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None]]
-
-    def getBoard(self):
-        """returns copy of board, so can not be editted"""
-        return self._board.copy()
-
-    def removePiece(self, x, y):
-        """x and y are ints representing coords"""
-        self._board[y][x] = None
-
-    def addPiece(self, x, y, piece):
-        """x and y are ints, piece is a piece object"""
-        self._board[y][x] = piece
-
-    def getPiece(self, x, y):
-        return self._board[y][x]
-
-    def movePiece(self, oldx, oldy, newx, newy):
-        """Moves a piece"""
-        piece = self.getPiece(oldx,oldy)
-        self.removePiece(oldx, oldy)
-        self.addPiece(newx, newy, piece)
-
-    def createKing(self, x, y):
-        piece = self.getPiece(x, y)
-        if piece != None:
-            piece.setKinged()
-
-    def resetBoard(self):
-        self._board = [[None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None],
-                      [None,None,None,None,None,None,None,None]]
-
-
-class Game(object):
+class Game(Engine):
     """Game object must first be initialised, then game loop can be ran"""
-    def __init__(self):
+    def __init__(self, whiteComputer=None, blackComputer=None, redrawOnChange=True, frameRate=60, instruments=None, showOverlay=False,
+                 boardSize=BOARD_SIZE):
+        """whiteComputer and blackComputer are optional computer players, a side without one is played
+        with the mouse. A SearchWorker thinks in the background while the window carries on,
+        anything else with a chooseMove method, such as AlphaBeta, is waited for.
+        With redrawOnChange the loop sleeps until there is an event, runs at most frameRate
+        times a second and only redraws the parts of the screen that changed.
+        instruments is an optional Instruments object to time the loop with, showOverlay draws its
+        numbers over the top of the screen. boardSize is the width of the board, the computer
+        players and PDN files only know 8x8"""
         pygame.init()
-        self._board = Board()
-        self.renderer = Renderer()
-        self._player1 = Player("White")
-        self._player2 = Player("Black")
-        self._whosTurn = self._player1
-        self._selected = (None, None)  #Will be this when nothing selected
-        self._piecesWithMoves = []     #Will contain pieces the player can move on their turn
-        self._selectedForced = False   #Used for combo taking
-        self._winner = None
+        Engine.__init__(self, boardSize)
+        self.renderer = Renderer(boardSize)
         self._endGame = False
-
-
-    def _setUpPlayer1(self):
-        for piece in self._player1.getPieces():
-            self._player1.removePiece(piece)
-        coords = ((0,0),(0,2),(0,4),(0,6),
-                  (1,1),(1,3),(1,5),(1,7),
-                  (2,0),(2,2),(2,4),(2,6))
-        for coord in coords:
-            piece = Piece("white")
-            self._player1.addPiece(piece)
-            self._board.addPiece(coord[1], coord[0], piece)
-       
-
-    def _setUpPlayer2(self):
-        for piece in self._player2.getPieces():
-            self._player2.removePiece(piece)
-        coords = ((5,1),(5,3),(5,5),(5,7),
-                  (6,0),(6,2),(6,4),(6,6),
-                  (7,1),(7,3),(7,5),(7,7))
-        for coord in coords:
-            piece = Piece("black")
-            self._player2.addPiece(piece)
-            self._board.addPiece(coord[1], coord[0], piece)
-
-
-    def _swapTurn(self):
-        if self._whosTurn == self._player1:
-            self._whosTurn = self._player2
-        else:
-            self._whosTurn = self._player1
-
-
-    def _setSelected(self, xBoard, yBoard):
-        """Sets selected tile, selected is a tuple"""      
-        self._selected = (xBoard, yBoard)
-        
-            
-
-    def _getSelected(self):
-        return self._selected
-
-    def _deselect(self):
-        """Resets selection"""
-        self._setSelected(None,None)
-        self._selectedForced = False
-
-    def _isSelected(self):
-        """Checks if nothing is selected"""
-        if self._getSelected() == (None, None):
-            return False
-        else:
-            return True
+        self._redrawOnChange = redrawOnChange
+        self._frameRate = frameRate
+        self._undoRecords = []    #Undo records of moves played, most recent last
+        self._redoMoves = []      #Moves that have been undone, most recent last
+        self._resumed = False     #True once a snapshot is loaded, the moves before it are not known
+        self.savePath = "game.pdn"
+        self._computers = {}
+        if whiteComputer != None:
+            self._computers[self._player1] = whiteComputer
+        if blackComputer != None:
+            self._computers[self._player2] = blackComputer
+        self._instruments = instruments
+        self._showOverlay = showOverlay
+        if instruments != None:
+            self._attachInstruments(instruments)
+
+
+    def _attachInstruments(self, instruments):
+        """Times the event handling, move generation and each render stage"""
+        for methodName in ("_onLMB", "_setUpTurn", "_findMoveableSquares", "_findMoveablePieces", "_movePiece"):
+            instruments.wrap(self, methodName)
+        for methodName in ("renderGame", "renderChanges", "_renderBackground", "_renderPieces", "_renderHighlighted",
+                           "_renderSelected", "_renderAvailableSquares", "_renderDeadPieces", "_renderWinningScreen"):
+            instruments.wrap(self.renderer, methodName)
 
 
     def _getHoveredSquare(self):
@@ -182,80 +58,13 @@ class Game(object):
     def _checkOnBoard(self, xScreen, yScreen):
         """xScreen and yScreen are coords of on screen box
            returns True if this box is on the game board"""
-        if yScreen < 3 or yScreen > 10 or xScreen > 7 or xScreen < 0:
+        size = self._geometry.size
+        if yScreen < 3 or yScreen > size + 2 or xScreen > size - 1 or xScreen < 0:
             return False
         else:
             return True
 
 
-    def _checkPossibleMovesWithDirection(self, xBoard, yBoard, yDirection):
-        """The only purpose of this is to be used in the _checkPossibleMoves function
-           so I dont have to type it twice for kinged pieces"""
-        currentPiece = self._board.getPiece(xBoard, yBoard)
-        if currentPiece == None:
-            return None
-        availableMoves = []
-        yScreen = yBoard + 3
-        xScreen = xBoard
-        if self._checkOnBoard(xScreen - 1, yScreen + yDirection):              #Do checks for forward+left
-            leftPiece = self._board.getPiece(xBoard - 1, yBoard + yDirection)
-            if leftPiece == None:
-                availableMoves.append((xBoard - 1, yBoard + yDirection, False))
-            elif leftPiece.getOwner() != currentPiece.getOwner():           #Forward left is occupied by oppenent
-                if self._checkOnBoard(xScreen - 2, yScreen + (yDirection*2)):
-                    if self._board.getPiece(xBoard - 2, yBoard + (yDirection*2)) == None:
-                        availableMoves.append((xBoard - 2, yBoard + (yDirection*2), True))
-        
-        if self._checkOnBoard(xScreen + 1, yScreen + yDirection):              #Do checks for forward+right
-            rightPiece = self._board.getPiece(xBoard + 1, yBoard + yDirection)
-            if rightPiece == None:
-                availableMoves.append((xBoard + 1, yBoard + yDirection, False))
-            elif rightPiece.getOwner() != currentPiece.getOwner():           #Forward right is occupied by opponent
-                if self._checkOnBoard(xScreen + 2, yScreen + (yDirection*2)):
-                    if self._board.getPiece(xBoard + 2, yBoard + (yDirection*2)) == None:
-                        availableMoves.append((xBoard + 2, yBoard + (yDirection*2), True))
-
-        return availableMoves
-
-
-    def _checkPossibleMoves(self, xBoard, yBoard):
-        """Returns a list of tuples which contain coords of possible moves of a
-        piece positioned at input coords, tuple will also have 3rd bool value
-        which says if piece was jumped over"""
-        currentPiece = self._board.getPiece(xBoard, yBoard)
-        if currentPiece == None:
-            return []
-        direction = currentPiece.getDirection()
-        availableMoves = self._checkPossibleMovesWithDirection(xBoard, yBoard, direction)
-        if currentPiece.getKinged():
-            extraMoves = self._checkPossibleMovesWithDirection(xBoard, yBoard, -direction)
-            for move in extraMoves:
-                availableMoves.append(move)
-        #Remove moves where piece not taken if possible to take one
-        canTake = False
-        for move in availableMoves:
-            if move[2] == True:
-                canTake = True
-                break
-        if canTake:
-            availableMovesCopy = availableMoves.copy()
-            for move in availableMovesCopy:
-                if move[2] != True :
-                    availableMoves.remove(move)
-        return availableMoves
-
-
-    def _checkActualMoves(self, xBoard, yBoard):
-        """Used to see what moves a player can take with a piece"""
-        currentPiece = self._board.getPiece(xBoard, yBoard)
-        if currentPiece == None:
-            return []
-        if currentPiece not in self._piecesWithMoves:
-            return []
-        else:
-            return self._checkPossibleMoves(xBoard, yBoard)
-                  
-        
     def _highlightPieceCheck(self, xScreen, yScreen):
         """
     returns coords of piece that needs to be highlighted
@@ -277,36 +86,9 @@ class Game(object):
             return (xBoard, yBoard)
 
 
-    def _movePiece(self, xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking):
-        """taking is a bool that says if a piece is being taken in this move"""
-        if not taking:
-            self._board.movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter)
-            self._createKings()
-            self._startNewTurn()
-        elif taking:
-            if xBoardAfter < xBoardOrig:
-                xSkew = -1
-            else:
-                xSkew = 1
-            if yBoardAfter < yBoardOrig:
-                ySkew = -1
-            else:
-                ySkew = 1
-            toRemovePiece = self._board.getPiece(xBoardOrig+xSkew, yBoardOrig+ySkew)
-            toRemovePiece.getOwner().removePiece(toRemovePiece)
-            self._board.removePiece(xBoardOrig+xSkew,yBoardOrig+ySkew)
-            self._board.movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter)
-            self._createKings()
-            newAvailable = self._checkPossibleMoves(xBoardAfter, yBoardAfter)
-            if newAvailable == [] or newAvailable[0][2] == False:
-                self._startNewTurn()
-            else:
-                self._setSelected(xBoardAfter, yBoardAfter)
-                self._selectedForced = True
-        
-
     def _onLMB(self):
         """Triggered when LMB is clicked"""
+        self.renderer.message = None
         xScreen, yScreen = self._getHoveredSquare()
         if not self._checkOnBoard(xScreen, yScreen):       #Trigger if not on board         
             return None
@@ -317,6 +99,8 @@ class Game(object):
                 self._initialise()
             elif xScreen in (2,3) and yScreen == 8:
                 self._closeGame()
+        if self._whosTurn in self._computers:              #Trigger if computer is playing this turn
+            return None
         if self._isSelected():                             #Trigger if piece is selected
             selectedCoords = self._getSelected()
             possibleMoves = self._checkActualMoves(selectedCoords[0], selectedCoords[1])
@@ -339,80 +123,118 @@ class Game(object):
         self._setSelected(xBoard, yBoard)
 
             
-    def _createKings(self):
-        """Scans top and bottom rows for opponent pieces and creates them"""
-        for i in range(8):
-            if self._board.getPiece(i,0) != None:
-                if self._board.getPiece(i,0).getDirection() == -1:
-                    self._board.createKing(i, 0)
-            if self._board.getPiece(i,7) != None:
-                if self._board.getPiece(i,7).getDirection() == 1:
-                    self._board.createKing(i, 7)
-
-
-    def _findMoveablePieces(self, player):
-        """Player is player object, returns list of moveavble pieces"""
-        canTake = False
-        moveablePieces = []
-        for y in range(8):
-            for x in range(8):
-                occupying = self._board.getPiece(x, y)
-                if occupying != None:
-                    if occupying.getOwner() == player:
-                        availableMoves = self._checkPossibleMoves(x,y)
-                        if not canTake:
-                            if availableMoves != []:
-                                if availableMoves[0][2] == False:
-                                    moveablePieces.append(occupying)
-                                elif availableMoves[0][2] == True:
-                                    canTake = True
-                                    moveablePieces = []
-                                    moveablePieces.append(occupying)
-                        elif canTake:
-                            if  availableMoves != []:
-                                if availableMoves[0][2] == True:
-                                    moveablePieces.append(occupying)
-        return moveablePieces
-
-
     def _closeGame(self):
         """Closes the game"""
+        if self._instruments != None and self._instruments.dumpPath != None:
+            self._instruments.dump()
+        for computer in self._computers.values():
+            if isinstance(computer, SearchWorker):
+                computer.close()
         pygame.quit()
         sys.exit()
 
 
-    def _setUpTurn(self):
-        moveablePieces = self._findMoveablePieces(self._whosTurn)
-        self._piecesWithMoves = moveablePieces
-        if self._piecesWithMoves == []:
-            if self._whosTurn == self._player1:
-                self._winner = self._player2
-            elif self._whosTurn == self._player2:
-                self._winner = self._player1
-             
+    def _initialise(self):
+        self._cancelComputers()
+        Engine._initialise(self)
+        self._endGame = False
+        self._undoRecords = []
+        self._redoMoves = []
+        self._resumed = False
 
-    def _startNewTurn(self):
-        """This swaps the players and sets up values for a new turn"""
-        self._deselect()
-        self._swapTurn()
-        self._setUpTurn()
 
+    def _movePiece(self, xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking):
+        """Plays the move and remembers it so it can be undone, this clears the redo moves"""
+        record = Engine._movePiece(self, xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking)
+        self._undoRecords.append(record)
+        self._redoMoves = []
+        return record
+
+
+    def _undo(self):
+        """Takes back moves until it is a person's turn again"""
+        self._cancelComputers()
+        while self._undoRecords != []:
+            record = self._undoRecords.pop()
+            self._unmovePiece(record)
+            self._redoMoves.append(record[:4] + (record[4] != None,))
+            if self._whosTurn not in self._computers:
+                break
+
+
+    def _redo(self):
+        """Plays undone moves again until it is a person's turn"""
+        self._cancelComputers()
+        while self._redoMoves != []:
+            move = self._redoMoves.pop()
+            self._undoRecords.append(Engine._movePiece(self, *move))
+            if self._whosTurn not in self._computers:
+                break
+
+
+    def _saveGame(self):
+        """Writes the moves played so far to savePath as PDN if it ends in .pdn,
+        otherwise writes a snapshot of the game as it is now. A game carried on from a snapshot
+        can only be saved as a snapshot, its PDN would be missing the moves before it.
+        Whether it was saved is shown at the bottom of the window"""
+        if not self.savePath.endswith(".pdn"):
+            with open(self.savePath, "wb") as saveFile:
+                saveFile.write(self.toBytes())
+            self.renderer.message = "Saved to " + self.savePath
+            return None
+        if self._geometry.size != BOARD_SIZE:
+            self.renderer.message = "Not saved, only 8x8 games can be saved as PDN"
+            return None
+        if self._resumed:
+            self.renderer.message = "Not saved, a game carried on from a snapshot can only be saved to a file not ending in .pdn"
+            return None
+        with open(self.savePath, "w") as saveFile:
+            saveFile.write(pdn.exportGame(self))
+        self.renderer.message = "Saved to " + self.savePath
+
+
+    def _loadGame(self, path):
+        """Plays the moves of the first game in a PDN file, stops at the first move that is not legal
+        and says so at the bottom of the window. A file that does not end in .pdn is a snapshot from _saveGame, the game carries on from it"""
+        if not path.endswith(".pdn"):
+            with open(path, "rb") as snapshotFile:
+                self.loadBytes(snapshotFile.read())
+            self._undoRecords = []
+            self._redoMoves = []
+            self._resumed = True
+            return None
+        with open(path) as pdnFile:
+            loadedGame = next(pdn.readGames(pdnFile), None)
+        if loadedGame == None:
+            return None
+        valid, error, game = pdn.replayGame(loadedGame["moves"], self)
+        if not valid:
+            self.renderer.message = "Stopped loading " + path + ", " + error
+
+
+    def _onKey(self, event):
+        """Ctrl+Z undoes a move, Ctrl+Y or Ctrl+Shift+Z redoes one, Ctrl+S saves the game"""
+        self.renderer.message = None
+        if not event.mod & pygame.KMOD_CTRL:
+            return None
+        if event.key == pygame.K_s:
+            self._saveGame()
+        elif event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT:
+            self._redo()
+        elif event.key == pygame.K_z:
+            self._undo()
+        elif event.key == pygame.K_y:
+            self._redo()
 
-    def _initialise(self):
-        self._board.resetBoard()
-        self._whosTurn = self._player1
-        self._selected = (None, None) 
-        self._piecesWithMoves = []     
-        self._selectedForced = False
-        self._winner = None
-        self._endGame = False
-        self._setUpPlayer1()
-        self._setUpPlayer2()
-        self._setUpTurn()
-                 
 
     def _gameloop(self):
+        clock = pygame.time.Clock()
+        instruments = self._instruments
         while not self._endGame:
+            if instruments != None:
+                instruments.startFrame()
+                if self._showOverlay:
+                    self.renderer.overlayLines = instruments.getOverlayLines()
             #Set up variables for renderer
             hoveredSquare = self._getHoveredSquare()
             highlightedPieceCoords = self._highlightPieceCheck(hoveredSquare[0],hoveredSquare[1])
@@ -422,30 +244,176 @@ class Game(object):
             else:
                 selectedCoords = None
                 availableMovesForSelected = None     
-            self.renderer.renderGame(self._board, self._player1, self._player2, highlightedPieceCoords, selectedCoords, availableMovesForSelected, self._winner)
+            computerToMove = self._winner == None and self._whosTurn in self._computers
+            if self._redrawOnChange:
+                self.renderer.renderChanges(self._board, self._player1, self._player2, highlightedPieceCoords, selectedCoords, availableMovesForSelected, self._winner)
+            else:
+                self.renderer.renderGame(self._board, self._player1, self._player2, highlightedPieceCoords, selectedCoords, availableMovesForSelected, self._winner)
+            if not computerToMove and self._winner == None:
+                self._ponderComputers()
             #Handle events
-            for event in pygame.event.get():
+            if self._redrawOnChange and not computerToMove:
+                if instruments != None:
+                    instruments.startIdle()
+                events = [pygame.event.wait()] + pygame.event.get()    #Sleep until something happens
+                if instruments != None:
+                    instruments.endIdle()
+            else:
+                events = pygame.event.get()
+            for event in events:
                 if event.type == pygame.QUIT:
                     self._closeGame()
                 elif event.type == pygame.MOUSEBUTTONUP:
                     self._onLMB()
-            
+                elif event.type == pygame.KEYDOWN:
+                    self._onKey(event)
+            computerToMove = self._winner == None and self._whosTurn in self._computers
+            if computerToMove:
+                self._playComputerMove()
+            if instruments != None:
+                instruments.endFrame()
+            if self._redrawOnChange:
+                clock.tick(self._frameRate)
+
+
+    def _playComputerMove(self):
+        """Lets the computer player whos turn it is make one move, a SearchWorker that is
+        still thinking is left to carry on and asked again next time round the loop"""
+        computer = self._computers[self._whosTurn]
+        if isinstance(computer, SearchWorker):
+            move = computer.getMove(self.getPosition())
+            if move == None:
+                return None
+            fromIndex, toIndex, takenIndex = move
+            self._movePiece(*(self._geometry.squareCoords(fromIndex) + self._geometry.squareCoords(toIndex) + (takenIndex != None,)))
+            return None
+        xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking = computer.chooseMove(self)
+        self._movePiece(xBoardOrig, yBoardOrig, xBoardAfter, yBoardAfter, taking)
+
+
+    def _ponderComputers(self):
+        """Lets background computers think about their next move while a person is choosing theirs"""
+        position = self.getPosition()
+        for computer in self._computers.values():
+            if isinstance(computer, SearchWorker):
+                computer.ponder(position)
 
-    def main(self):
+
+    def _cancelComputers(self):
+        """Stops background computers thinking, for when the position they are thinking about is gone"""
+        for computer in self._computers.values():
+            if isinstance(computer, SearchWorker):
+                computer.cancel()
+
+
+    def main(self, pdnPath=None):
+        """pdnPath is an optional PDN file whose first game is played out before the loop starts,
+        or a snapshot file to carry on from"""
         self._initialise()
+        if pdnPath != None:
+            self._loadGame(pdnPath)
         self._gameloop()
 
 
 
-class Renderer(object):
+class AssetCache(object):
+    """Pre-rendered surfaces for the renderer, so a frame is mostly blits.
+    Everything is thrown away when the scheme (tilesize and colours) changes"""
     def __init__(self):
-        """Sets up some contants, some can be changed for configuration"""
-        self._tilesize = 60  #Can be editted
-        self._boardwidth = 8
-        self._boardheight = 14
+        self._scheme = None
+        self._surfaces = {}
+        self._fonts = {}
+
+
+    def checkScheme(self, scheme):
+        """scheme is a tuple of everything the cached surfaces were drawn with"""
+        if scheme != self._scheme:
+            self._scheme = scheme
+            self._surfaces = {}
+
+
+    def clear(self):
+        self._surfaces = {}
+        self._fonts = {}
+
+
+    def getBackground(self, size, tilesize, boardSize, backColour, tile1Colour, tile2Colour):
+        """Returns a surface of the given size with the empty board drawn on it, boardSize is the board width in tiles"""
+        key = ("background", size, tilesize, boardSize, backColour, tile1Colour, tile2Colour)
+        if key not in self._surfaces:
+            surface = pygame.Surface(size)
+            surface.fill(backColour)
+            for row in range(3,3+boardSize):
+                for column in range(0,boardSize):
+                    if row % 2 == 1:
+                        if column % 2 == 0:
+                            colour = tile2Colour
+                        else:
+                            colour = tile1Colour
+                    else:
+                        if column % 2 == 0:
+                            colour = tile1Colour
+                        else:
+                            colour = tile2Colour
+                    pygame.draw.rect(surface, colour, (column*tilesize, row*tilesize, tilesize, tilesize))
+            self._surfaces[key] = surface
+        return self._surfaces[key]
+
+
+    def getRing(self, tilesize, colour, width):
+        """Returns a tile sized sprite of a circle filling the tile, width 0 is a solid circle"""
+        key = ("ring", tilesize, colour, width)
+        if key not in self._surfaces:
+            surface = pygame.Surface((tilesize, tilesize), pygame.SRCALPHA)
+            midpoint = tilesize // 2
+            pygame.draw.circle(surface, colour, (midpoint, midpoint), tilesize // 2, width)
+            self._surfaces[key] = surface
+        return self._surfaces[key]
+
+
+    def getPiece(self, tilesize, colour, kingColour=None):
+        """Returns a tile sized sprite of a piece, with a king marker if kingColour is given"""
+        key = ("piece", tilesize, colour, kingColour)
+        if key not in self._surfaces:
+            surface = self.getRing(tilesize, colour, 0).copy()
+            if kingColour != None:
+                midpoint = tilesize // 2
+                pygame.draw.circle(surface, kingColour, (midpoint, midpoint), (tilesize // 2) // 2)
+            self._surfaces[key] = surface
+        return self._surfaces[key]
+
+
+    def getFont(self, size):
+        if size not in self._fonts:
+            self._fonts[size] = pygame.font.Font(pygame.font.get_default_font(), size)
+        return self._fonts[size]
+
+
+    def getText(self, text, size, colour, background=None):
+        """Returns the text rendered in the default font, background None leaves it transparent"""
+        key = ("text", text, size, colour, background)
+        if key not in self._surfaces:
+            self._surfaces[key] = self.getFont(size).render(text, True, colour, background)
+        return self._surfaces[key]
+
+
+
+class Renderer(object):
+    def __init__(self, boardSize=BOARD_SIZE, offscreen=False):
+        """Sets up some contants, some can be changed for configuration.
+        boardSize is the width of the board in tiles, there are three rows of captured pieces above and below it.
+        offscreen draws onto a plain surface instead of opening the window, for saving images"""
+        self._tilesize = min(60, 840 // (boardSize + 6))  #Can be editted, bigger boards get smaller tiles to fit the screen
+        self._boardwidth = boardSize
+        self._boardheight = boardSize + 6
+        self._piecesPerSide = getGeometry(boardSize).piecesPerSide
         self.highlightThickness = 10  #Can be editted
-        self._surface = pygame.display.set_mode((self._boardwidth*self._tilesize,self._boardheight*self._tilesize))
-        pygame.display.set_caption("Checkers")
+        self._offscreen = offscreen
+        if offscreen:
+            self._surface = pygame.Surface((self._boardwidth*self._tilesize,self._boardheight*self._tilesize))
+        else:
+            self._surface = pygame.display.set_mode((self._boardwidth*self._tilesize,self._boardheight*self._tilesize))
+            pygame.display.set_caption("Checkers")
         self.WHITE = (255,255,255)   
         self.BLACK = (0,0,0)   
         self.BEIGE = (245,245,220)  
@@ -454,77 +422,76 @@ class Renderer(object):
         self.YELLOW = (255, 255, 0)
         self.CRIMSON = (220, 20, 60)
         self.BLUE = (0, 0, 255)
+        #Captured pieces fill rows inwards from the top and bottom edges
+        self._deadBlackCoords = tuple((i % boardSize, i // boardSize) for i in range(self._piecesPerSide))
+        self._deadWhiteCoords = tuple((i % boardSize, self._boardheight - 1 - i // boardSize) for i in range(self._piecesPerSide))
+        self._lastTiles = None   #What each screen tile showed when renderChanges last drew it
+        self._lastWinner = None
+        self._assets = AssetCache()
+        self.overlayLines = None  #Lines of text drawn over the top three rows, None draws nothing
+        self.message = None       #Text drawn over the bottom two rows, such as whether a save worked, None draws nothing
+        self._messageRows = 2
 
 
     def getTilesize(self):
         return self._tilesize
 
+
+    def getSurface(self):
+        """Returns the surface everything is drawn on, the window unless the renderer is offscreen"""
+        return self._surface
+
         
+    def _getAssets(self):
+        """Returns the asset cache, emptying it first if the tilesize or colours have been changed"""
+        self._assets.checkScheme((self._tilesize, self.highlightThickness, self.WHITE, self.BLACK, self.BEIGE,
+                                  self.BROWN, self.GREEN, self.YELLOW, self.CRIMSON, self.BLUE))
+        return self._assets
+
+
+    def _blitTile(self, sprite, xScreen, yScreen):
+        self._surface.blit(sprite, (xScreen*self._tilesize, yScreen*self._tilesize))
+
+
     def _renderBackground(self, backColour, tile1Colour, tile2Colour):
         """All parameters are tuples of 3 ints representing RGB values"""
-        self._surface.fill(backColour)
-        for row in range(3,11):
-            for column in range(0,8):
-                if row % 2 == 1:
-                    if column % 2 == 0:
-                        colour = tile2Colour
-                    else:
-                        colour = tile1Colour
-                else:
-                    if column % 2 == 0:
-                        colour = tile1Colour
-                    else:
-                        colour = tile2Colour                 
-                pygame.draw.rect(self._surface, colour, (column*self._tilesize, row*self._tilesize, self._tilesize, self._tilesize))
+        background = self._getAssets().getBackground(self._surface.get_size(), self._tilesize, self._boardwidth, backColour, tile1Colour, tile2Colour)
+        self._surface.blit(background, (0, 0))
 
 
     def _renderPieces(self, board, whiteColour, blackColour, kingColour):
         """board is Board object whiteColour is colour of 'white' pieces, blackColour is colour of opposing
            kingColour is colour of king marker"""
         rowOffset = 3
-        midpoint = self._tilesize // 2
-        radius = self._tilesize // 2   
-        for row in range(8):
-            for column in range(8):
+        assets = self._getAssets()
+        for row in range(board.getSize()):
+            for column in range(board.getSize()):
                 piece = board.getPiece(column, row)
                 if piece != None:
                     if piece.getColour() == "white":
                         colour = whiteColour
                     else:
                         colour = blackColour
-                    yPosition = ((row + rowOffset) * self._tilesize) + midpoint
-                    xPosition = (column * self._tilesize) + midpoint
-                    pygame.draw.circle(self._surface, colour, (xPosition, yPosition), radius)
                     if piece.getKinged():
-                        pygame.draw.circle(self._surface, kingColour, (xPosition, yPosition), radius//2)
-                        
+                        sprite = assets.getPiece(self._tilesize, colour, kingColour)
+                    else:
+                        sprite = assets.getPiece(self._tilesize, colour)
+                    self._blitTile(sprite, column, row + rowOffset)
 
 
     def _renderHighlighted(self, highlightedPieceCoords, width, highlightColour):
         """coords are on board box coords, width is int representing thickness of highlight circle"""
         if highlightedPieceCoords == None:
             return None
-        yScreen = highlightedPieceCoords[1] + 3
-        xScreen = highlightedPieceCoords[0]
-        midpoint = self._tilesize//2
-        radius = self._tilesize//2
-        yPosition = yScreen*self._tilesize + midpoint
-        xPosition = xScreen*self._tilesize + midpoint
-        pygame.draw.circle(self._surface, highlightColour, (xPosition, yPosition), radius, width)
+        sprite = self._getAssets().getRing(self._tilesize, highlightColour, width)
+        self._blitTile(sprite, highlightedPieceCoords[0], highlightedPieceCoords[1] + 3)
 
 
     def _renderSelected(self, selectedPieceCoords, width, selectedColour):
         if selectedPieceCoords == None:
             return None
-        yBoard = selectedPieceCoords[1]
-        xBoard = selectedPieceCoords[0]
-        yScreen = yBoard + 3
-        xScreen = xBoard
-        midpoint = self._tilesize // 2
-        radius = self._tilesize // 2
-        yPosition = yScreen*self._tilesize + midpoint
-        xPosition = xScreen*self._tilesize + midpoint
-        pygame.draw.circle(self._surface, selectedColour, (xPosition, yPosition), radius, width)
+        sprite = self._getAssets().getRing(self._tilesize, selectedColour, width)
+        self._blitTile(sprite, selectedPieceCoords[0], selectedPieceCoords[1] + 3)
 
 
     def _renderAvailableSquares(self, availableSquareCoords, squareColour):
@@ -534,46 +501,69 @@ class Renderer(object):
             return None
         for coord in availableSquareCoords:
             xPosition = coord[0] * self._tilesize
-            yPosition = (coord[1]+3) * self._tilesize 
-            pygame.draw.rect(self._surface, squareColour, (xPosition, yPosition, self._tilesize, self._tilesize))
+            yPosition = (coord[1]+3) * self._tilesize
+            self._surface.fill(squareColour, (xPosition, yPosition, self._tilesize, self._tilesize))
 
 
     def _renderDeadPieces(self, whitePlayer, blackPlayer, whiteColour, blackColour):
-        deadWhitePieces = 12 - len(whitePlayer.getPieces())
-        deadBlackPieces = 12 - len(blackPlayer.getPieces())
-        midpoint = self._tilesize // 2
-        radius = self._tilesize // 2
-        deadBlackCoords = ((0,0),(1,0),(2,0),(3,0),(4,0),(5,0),(6,0),(7,0),(0,1),(1,1),(2,1),(3,1))
-        deadWhiteCoords = ((0,13),(1,13),(2,13),(3,13),(4,13),(5,13),(6,13),(7,13),(0,12),(1,12),(2,12),(3,12))
+        deadWhitePieces = self._piecesPerSide - whitePlayer.getPieceCount()
+        deadBlackPieces = self._piecesPerSide - blackPlayer.getPieceCount()
+        assets = self._getAssets()
+        whiteSprite = assets.getPiece(self._tilesize, whiteColour)
+        blackSprite = assets.getPiece(self._tilesize, blackColour)
         for i in range(deadWhitePieces):
-            coord = deadWhiteCoords[i]
-            xPosition = (coord[0] * self._tilesize) + midpoint
-            yPosition = (coord[1] * self._tilesize) + midpoint
-            pygame.draw.circle(self._surface, whiteColour, (xPosition, yPosition), radius)
+            self._blitTile(whiteSprite, self._deadWhiteCoords[i][0], self._deadWhiteCoords[i][1])
         for i in range(deadBlackPieces):
-            coord = deadBlackCoords[i]
-            xPosition = (coord[0] * self._tilesize) + midpoint
-            yPosition = (coord[1] * self._tilesize) + midpoint
-            pygame.draw.circle(self._surface, blackColour, (xPosition, yPosition), radius)
+            self._blitTile(blackSprite, self._deadBlackCoords[i][0], self._deadBlackCoords[i][1])
 
 
     def _renderWinningScreen(self, winner, textColour, buttonColour):
         if winner == None:
             return None
-        winnerName = winner.getName()
-        fontFile = pygame.font.get_default_font()
-        fontObj = pygame.font.Font(fontFile, 40)
-        textWinner = winnerName + " Wins!"
-        textWinnerSurface = fontObj.render(textWinner, True, textColour)
+        assets = self._getAssets()
+        textWinnerSurface = assets.getText(winner.getName() + " Wins!", 40, textColour)
         self._surface.blit(textWinnerSurface, (2 * self._tilesize, 3 * self._tilesize))
-        textRestartSurface = fontObj.render("Restart?", True, textColour, buttonColour)
+        textRestartSurface = assets.getText("Restart?", 40, textColour, buttonColour)
         self._surface.blit(textRestartSurface, (2 * self._tilesize, 7 * self._tilesize))
-        textQuitSurface = fontObj.render("Quit!", True, textColour, buttonColour)
+        textQuitSurface = assets.getText("Quit!", 40, textColour, buttonColour)
         self._surface.blit(textQuitSurface, (2 * self._tilesize, 8 * self._tilesize))
-                
-                                       
-    def renderGame(self, board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner):
-        """Board is a board object"""
+
+
+    def _renderOverlay(self, textColour, size):
+        """Draws overlayLines in two columns on a see through panel over the top three rows"""
+        if self.overlayLines == None:
+            return None
+        panel = pygame.Surface((self._boardwidth * self._tilesize, 3 * self._tilesize), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        font = self._getAssets().getFont(size)
+        linesPerColumn = (3 * self._tilesize) // font.get_linesize()
+        columnWidth = panel.get_width() // 2
+        for i, line in enumerate(self.overlayLines[:linesPerColumn * 2]):
+            text = font.render(line, True, textColour)
+            panel.blit(text, ((i // linesPerColumn) * columnWidth + 2, (i % linesPerColumn) * font.get_linesize()))
+        self._surface.blit(panel, (0, 0))
+
+
+    def _renderMessage(self, textColour, size):
+        """Draws message wrapped onto a see through panel over the bottom rows"""
+        if self.message == None:
+            return None
+        panel = pygame.Surface((self._boardwidth * self._tilesize, self._messageRows * self._tilesize), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        font = self._getAssets().getFont(size)
+        lines = []
+        for word in self.message.split():
+            if lines != [] and font.size(lines[-1] + " " + word)[0] <= panel.get_width() - 4:
+                lines[-1] += " " + word
+            else:
+                lines.append(word)
+        for i, line in enumerate(lines[:panel.get_height() // font.get_linesize()]):
+            panel.blit(font.render(line, True, textColour), (2, i * font.get_linesize()))
+        self._surface.blit(panel, (0, (self._boardheight - self._messageRows) * self._tilesize))
+
+
+    def _renderLayers(self, board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner):
+        """Draws the whole game onto the surface, drawing is limited to the surface clip if one is set"""
         self._renderBackground(self.GREEN, self.BEIGE, self.BROWN)
         self._renderPieces(board, self.WHITE, self.BLACK, self.YELLOW)
         self._renderHighlighted(highlightedPieceCoords, self.highlightThickness, self.YELLOW)
@@ -581,10 +571,112 @@ class Renderer(object):
         self._renderAvailableSquares(availableSquareCoords, self.CRIMSON)
         self._renderDeadPieces(whitePlayer, blackPlayer, self.WHITE, self.BLACK)
         self._renderWinningScreen(winner, self.BLUE, self.YELLOW)
-        pygame.display.update()
+        self._renderOverlay(self.WHITE, 10)
+        self._renderMessage(self.WHITE, 14)
+
+
+    def _tileContents(self, board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords):
+        """Returns dict of screen tile coords to a value that changes whenever what is drawn on that tile changes"""
+        tiles = {}
+        availableSquares = set()
+        if availableSquareCoords != None:
+            availableSquares = set((coord[0], coord[1]) for coord in availableSquareCoords)
+        for yBoard in range(board.getSize()):
+            for xBoard in range(board.getSize()):
+                piece = board.getPiece(xBoard, yBoard)
+                if piece != None:
+                    piece = (piece.getColour(), piece.getKinged())
+                tiles[(xBoard, yBoard + 3)] = (piece, (xBoard, yBoard) == highlightedPieceCoords,
+                                               (xBoard, yBoard) == selectedPieceCoords, (xBoard, yBoard) in availableSquares)
+        deadWhitePieces = self._piecesPerSide - whitePlayer.getPieceCount()
+        deadBlackPieces = self._piecesPerSide - blackPlayer.getPieceCount()
+        for i in range(self._piecesPerSide):
+            tiles[self._deadWhiteCoords[i]] = i < deadWhitePieces
+            tiles[self._deadBlackCoords[i]] = i < deadBlackPieces
+        if self.overlayLines != None:
+            overlay = tuple(self.overlayLines)
+            for yScreen in range(3):
+                for xScreen in range(self._boardwidth):
+                    tiles[(xScreen, yScreen)] = (tiles.get((xScreen, yScreen)), overlay)
+        for yScreen in range(self._boardheight - self._messageRows, self._boardheight):    #Even without a message, so the keys never change
+            for xScreen in range(self._boardwidth):
+                tiles[(xScreen, yScreen)] = (tiles.get((xScreen, yScreen)), self.message)
+        return tiles
 
 
-if __name__ == "__main__":      
-    game = Game()
-    game.main()
+    def renderGame(self, board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner):
+        """Board is a board object"""
+        self._renderLayers(board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner)
+        if not self._offscreen:
+            pygame.display.update()
+        self._lastTiles = None
+
+
+    def renderChanges(self, board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner):
+        """Same arguments as renderGame, but only redraws and updates the tiles that look different
+        since the last call. Returns the list of rects that were updated"""
+        tiles = self._tileContents(board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords)
+        if self._lastTiles == None or winner != self._lastWinner:
+            self._renderLayers(board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner)
+            if not self._offscreen:
+                pygame.display.update()
+            dirtyRects = [self._surface.get_rect()]
+        else:
+            dirtyRects = []
+            for coord in tiles:
+                if tiles[coord] != self._lastTiles[coord]:
+                    rect = pygame.Rect(coord[0]*self._tilesize, coord[1]*self._tilesize, self._tilesize, self._tilesize)
+                    self._surface.set_clip(rect)
+                    self._renderLayers(board, whitePlayer, blackPlayer, highlightedPieceCoords, selectedPieceCoords, availableSquareCoords, winner)
+                    dirtyRects.append(rect)
+            self._surface.set_clip(None)
+            if dirtyRects != [] and not self._offscreen:
+                pygame.display.update(dirtyRects)
+        self._lastTiles = tiles
+        self._lastWinner = winner
+        return dirtyRects
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkers in python using pygame")
+    parser.add_argument("--computer", choices=("white", "black", "both"), help="side played by the computer")
+    parser.add_argument("--think-time", type=float, default=1.0, help="seconds the computer may think per move")
+    parser.add_argument("--engine", choices=("alphabeta", "mcts"), default="alphabeta",
+                        help="alpha-beta search or Monte Carlo tree search, either thinks in the background")
+    parser.add_argument("--tablebase", help="endgame tablebase file made by tablebase.py for the computer to use")
+    parser.add_argument("--book", help="opening book file made by book.py for the computer to use")
+    parser.add_argument("--load", help="PDN file to carry on the first game of, or a snapshot saved with Ctrl+S")
+    parser.add_argument("--save", default="game.pdn", help="file Ctrl+S saves the game to, as PDN if it ends in .pdn otherwise a snapshot")
+    parser.add_argument("--always-redraw", action="store_true", help="redraw the whole screen every loop instead of only on changes")
+    parser.add_argument("--search-workers", type=int, default=1, help="processes the computer searches with")
+    parser.add_argument("--no-ponder", action="store_true", help="stop the computer thinking on your time")
+    parser.add_argument("--fps", type=int, default=60, help="most frames drawn a second when only redrawing on changes")
+    parser.add_argument("--overlay", action="store_true", help="time the game loop and show the timings on screen")
+    parser.add_argument("--stats-file", help="time the game loop and add the timings to this file, CSV if it ends in .csv otherwise JSON lines")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="seconds between timings added to --stats-file")
+    parser.add_argument("--board-size", type=int, choices=(8, 10, 12), default=BOARD_SIZE, help="width and height of the board")
+    args = parser.parse_args()
+    loadingPdn = args.load != None and args.load.endswith(".pdn")
+    if args.load != None and not loadingPdn:
+        with open(args.load, "rb") as snapshotFile:
+            args.board_size = Snapshot(snapshotFile.read()).getBoardSize()    #A snapshot knows its board size
+    if args.board_size != BOARD_SIZE and ((args.computer != None and args.engine != "mcts") or loadingPdn):
+        parser.error("PDN files and the alphabeta engine only work on 8x8 boards")
+    whiteComputer = None
+    blackComputer = None
+    if args.engine == "mcts":
+        makeComputer = lambda: SearchWorker(args.think_time, ponder=not args.no_ponder, engine="mcts", boardSize=args.board_size)
+    else:
+        makeComputer = lambda: SearchWorker(args.think_time, tablebasePath=args.tablebase, bookPath=args.book,
+                                            ponder=not args.no_ponder, workers=args.search_workers)
+    if args.computer in ("white", "both"):
+        whiteComputer = makeComputer()
+    if args.computer in ("black", "both"):
+        blackComputer = makeComputer()
+    instruments = None
+    if args.overlay or args.stats_file != None:
+        instruments = Instruments(args.stats_file, args.stats_interval)
+    game = Game(whiteComputer, blackComputer, not args.always_redraw, args.fps, instruments, args.overlay, args.board_size)
+    game.savePath = args.save
+    game.main(args.load)
         
@@ -0,0 +1,328 @@
+"""Monte Carlo tree search computer player (UCT). Needs no evaluation, each position in the tree is
+scored by how random playouts from it turn out. Playouts run on bare bitboards with no Piece or
+Player objects, and the tree is kept between moves so work on the move that was played is not lost"""
+import argparse, json, math, random, time
+from engine import (BOARD_SIZE, TOP_ROW, BOTTOM_ROW, getGeometry, generateMoves, moveableMasks,
+                    positionMoves, playPositionMove, countBits)
+
+
+PLAYOUT_POLICIES = ("random", "capture")
+REUSE_DEPTH = 6              #Moves down the old tree looked through for the new position
+PROGRESS_INTERVAL = 0.25     #Seconds between calls to onProgress
+
+
+class _Node(object):
+    """A position in the tree. wins is from the point of view of the side that made move,
+    untried is None until the node is first visited"""
+    __slots__ = ("position", "move", "whiteMoved", "children", "untried", "visits", "wins")
+
+    def __init__(self, position, move, whiteMoved):
+        self.position = position
+        self.move = move
+        self.whiteMoved = whiteMoved
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+
+
+class MonteCarlo(object):
+    """Computer player, timeLimit is seconds per move and playoutLimit the most playouts per move,
+    either can be None but not both. nodeBudget is the most positions kept in the tree, once it is
+    full playouts carry on from the leaves without adding to it. playoutPolicy is "random", or
+    "capture" to mostly avoid moves that hand the opponent a capture. Playouts longer than
+    playoutMoves moves are scored on material. Used the same way as search.AlphaBeta, stopEvent and
+    onProgress included, onProgress is called with (depth, score, move, nodes) every PROGRESS_INTERVAL
+    seconds where depth is the length of the most played line, score the win rate of move and nodes the playouts so far"""
+    def __init__(self, timeLimit=1.0, playoutLimit=None, nodeBudget=100000, exploration=1.4,
+                 playoutPolicy="random", playoutMoves=150, boardSize=BOARD_SIZE, seed=None):
+        if timeLimit == None and playoutLimit == None:
+            raise ValueError("MonteCarlo needs a time limit or a playout limit")
+        if playoutPolicy not in PLAYOUT_POLICIES:
+            raise ValueError("Unknown playout policy " + repr(playoutPolicy))
+        self.timeLimit = timeLimit
+        self.playoutLimit = playoutLimit
+        self.nodeBudget = nodeBudget
+        self.exploration = exploration
+        self.playoutPolicy = playoutPolicy
+        self.playoutMoves = playoutMoves
+        self._geometry = getGeometry(boardSize)
+        if boardSize == BOARD_SIZE:
+            self._generate = generateMoves
+            self._kingRows = {1: BOTTOM_ROW, -1: TOP_ROW}
+        else:
+            self._generate = self._geometry.generateMoves
+            self._kingRows = {1: self._geometry.bottomRow, -1: self._geometry.topRow}
+        self._rng = random.Random(seed)
+        self._root = None
+        self._nodeCount = 0
+        self._stats = {}
+        self._deadline = None
+        self.stopEvent = None
+        self.onProgress = None
+
+
+    def chooseMove(self, game):
+        """game is an Engine, returns (xFrom, yFrom, xTo, yTo, taking) to play"""
+        fromIndex, toIndex, takenIndex = self.searchPosition(game.getPosition())
+        return self._geometry.squareCoords(fromIndex) + self._geometry.squareCoords(toIndex) + (takenIndex != None,)
+
+
+    def searchPosition(self, position, playouts=None):
+        """Returns the move (fromIndex, toIndex, takenIndex) played most in the search, runs playouts
+        playouts if given, otherwise until the time or playout limit is reached"""
+        moves = positionMoves(position, self._geometry)
+        if moves == []:
+            return None
+        startTime = time.perf_counter()
+        reused = self._reuseTree(position)
+        if len(moves) == 1 and playouts == None:
+            limit = 0
+            self._deadline = None
+        elif playouts != None:
+            limit = playouts
+            self._deadline = None
+        else:
+            limit = self.playoutLimit
+            self._deadline = None if self.timeLimit == None else startTime + self.timeLimit
+        root = self._root
+        count = 0
+        nextProgress = startTime + PROGRESS_INTERVAL
+        while limit == None or count < limit:
+            now = time.perf_counter()
+            if self._deadline != None and now > self._deadline:
+                break
+            if self.stopEvent != None and self.stopEvent.is_set():
+                break
+            if self.onProgress != None and now > nextProgress:
+                nextProgress = now + PROGRESS_INTERVAL
+                self._reportProgress(root, count)
+            self._iterate(root)
+            count += 1
+        elapsed = time.perf_counter() - startTime
+        best = self._mostPlayed(root)
+        if best == None:
+            bestMove = moves[0]
+            winRate = 0.5
+        else:
+            bestMove = best.move
+            winRate = best.wins / best.visits
+        self._stats = {"playouts": count,
+                       "seconds": elapsed,
+                       "playoutsPerSecond": count / elapsed if elapsed > 0 else 0.0,
+                       "treeNodes": self._nodeCount,
+                       "reusedNodes": reused,
+                       "rootVisits": root.visits,
+                       "winRate": winRate}
+        return bestMove
+
+
+    def setDeadline(self, seconds):
+        """Gives the search that is running seconds from now to finish, can be called from another thread"""
+        self._deadline = time.perf_counter() + seconds
+
+
+    def getTableMove(self, position):
+        """Returns the move played most from position if it is in the tree, otherwise None"""
+        node = self._findNode(position)
+        if node == None:
+            return None
+        best = self._mostPlayed(node)
+        return None if best == None else best.move
+
+
+    def getStats(self):
+        """Returns a dict describing the last search, playouts, playoutsPerSecond, treeNodes,
+        reusedNodes (nodes kept from the search before) and winRate of the chosen move"""
+        return dict(self._stats)
+
+
+    def clearTree(self):
+        self._root = None
+        self._nodeCount = 0
+
+
+    def _reuseTree(self, position):
+        """Makes the node for position the root, taking it from the old tree if it is a few moves
+        down it. Returns the number of nodes kept"""
+        node = self._findNode(position)
+        if node != None:
+            self._root = node
+            self._nodeCount = self._countNodes(node)
+            return self._nodeCount
+        self._root = _Node(position, None, not position[3])
+        self._nodeCount = 1
+        return 0
+
+
+    def _findNode(self, position):
+        """Returns the node for position if it is within REUSE_DEPTH moves of the root, otherwise None"""
+        if self._root == None:
+            return None
+        level = [self._root]
+        for depth in range(REUSE_DEPTH + 1):
+            for node in level:
+                if node.position == position:
+                    return node
+            level = [child for node in level for child in node.children]
+            if level == []:
+                break
+        return None
+
+
+    def _mostPlayed(self, node):
+        if node.children == []:
+            return None
+        return max(node.children, key=lambda child: child.visits)
+
+
+    def _reportProgress(self, root, playouts):
+        best = self._mostPlayed(root)
+        if best == None:
+            return None
+        depth = 0
+        node = best
+        while node != None:
+            depth += 1
+            node = self._mostPlayed(node)
+        self.onProgress(depth, best.wins / best.visits, best.move, playouts)
+
+
+    def _countNodes(self, node):
+        count = 0
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+
+    def _iterate(self, root):
+        """One round of selection, expansion, playout and backing up the result"""
+        node = root
+        path = [root]
+        while True:
+            if node.untried == None:
+                node.untried = positionMoves(node.position, self._geometry)
+                self._rng.shuffle(node.untried)
+            if node.untried != [] or node.children == []:
+                break
+            node = self._select(node)
+            path.append(node)
+        if node.untried != [] and self._nodeCount < self.nodeBudget:
+            move = node.untried.pop()
+            child = _Node(playPositionMove(node.position, move, self._geometry), move, node.position[3])
+            node.children.append(child)
+            self._nodeCount += 1
+            node = child
+            path.append(node)
+        whiteScore = self._playout(node.position)
+        for node in path:
+            node.visits += 1
+            node.wins += whiteScore if node.whiteMoved else 1.0 - whiteScore
+
+
+    def _select(self, node):
+        """Returns the child with the highest upper confidence bound"""
+        logVisits = math.log(node.visits)
+        exploration = self.exploration
+        best = None
+        bestValue = -1.0
+        for child in node.children:
+            value = child.wins / child.visits + exploration * math.sqrt(logVisits / child.visits)
+            if value > bestValue:
+                best = child
+                bestValue = value
+        return best
+
+
+    def _givesCapture(self, own, opponent, kings, direction):
+        """True if opponent, moving in -direction, can take a piece of own"""
+        if self._generate is generateMoves:
+            return moveableMasks(opponent, own, kings, -direction)[1] != 0
+        replies = self._generate(opponent, own, kings, -direction)
+        return replies != [] and replies[0][2] != None
+
+
+    def _playout(self, position):
+        """Plays random moves from position on bitboards alone, returns 1.0 if white wins,
+        0.0 if black wins and 0.5 for an even draw when playoutMoves runs out"""
+        white, black, kings, whiteToMove, forcedIndex = position
+        if whiteToMove:
+            own, opponent, direction = white, black, 1
+        else:
+            own, opponent, direction = black, white, -1
+        generate = self._generate
+        kingRows = self._kingRows
+        random = self._rng.random
+        biased = self.playoutPolicy == "capture"
+        for step in range(self.playoutMoves):
+            moves = generate(own, opponent, kings, direction, forcedIndex)
+            if moves == []:
+                return 0.0 if direction == 1 else 1.0
+            move = moves[int(random() * len(moves))]
+            if biased and move[2] == None and len(moves) > 1:
+                #One more try if the move leaves a piece to be taken
+                fromBit = 1 << move[0]
+                toBit = 1 << move[1]
+                movedKings = kings ^ fromBit ^ toBit if kings & fromBit else kings
+                if self._givesCapture(own ^ fromBit ^ toBit, opponent, movedKings, direction):
+                    move = moves[int(random() * len(moves))]
+            fromIndex, toIndex, takenIndex = move
+            fromBit = 1 << fromIndex
+            toBit = 1 << toIndex
+            own ^= fromBit | toBit
+            if kings & fromBit:
+                kings ^= fromBit | toBit
+            elif toBit & kingRows[direction]:
+                kings |= toBit
+            forcedIndex = None
+            if takenIndex != None:
+                takenBit = 1 << takenIndex
+                opponent ^= takenBit
+                kings &= ~takenBit
+                nextJumps = generate(own, opponent, kings, direction, toIndex)
+                if nextJumps != []:
+                    forcedIndex = toIndex
+                    continue
+            own, opponent, direction = opponent, own, -direction
+        if direction == 1:
+            white, black = own, opponent
+        else:
+            white, black = opponent, own
+        #Kings count as one and a half men
+        material = 2 * (countBits(white) - countBits(black)) + countBits(white & kings) - countBits(black & kings)
+        if material > 0:
+            return 1.0
+        elif material < 0:
+            return 0.0
+        return 0.5
+
+
+def measurePlayouts(seconds, policies=PLAYOUT_POLICIES, boardSize=BOARD_SIZE):
+    """Searches the starting position for seconds with each playout policy,
+    returns a list of dicts of the search stats"""
+    from engine import Engine
+    game = Engine(boardSize)
+    game.newGame()
+    report = []
+    for policy in policies:
+        search = MonteCarlo(seconds, playoutPolicy=policy, boardSize=boardSize, seed=0)
+        search.searchPosition(game.getPosition())
+        stats = search.getStats()
+        stats["policy"] = policy
+        stats["boardSize"] = boardSize
+        report.append(stats)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Monte Carlo tree search playouts a second from the start")
+    parser.add_argument("--time", type=float, default=2.0, help="seconds each playout policy searches for")
+    parser.add_argument("--policy", choices=PLAYOUT_POLICIES, nargs="+", default=list(PLAYOUT_POLICIES))
+    parser.add_argument("--board-size", type=int, choices=(8, 10, 12), default=BOARD_SIZE)
+    args = parser.parse_args()
+    for line in measurePlayouts(args.time, args.policy, args.board_size):
+        print(json.dumps(line))
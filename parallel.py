@@ -0,0 +1,234 @@
+"""Parallel alpha-beta search in the Lazy SMP style. Helper processes search the same position
+as the main search, with the root moves in different orders and odd helpers a depth deeper,
+and everything they find goes into a transposition table in shared memory that all of them probe.
+The main search decides the move, helpers only make it faster by filling the table"""
+import argparse, json, multiprocessing, random, time
+from search import AlphaBeta
+from engine import Engine, positionMoves
+
+
+NO_MOVE = 0xFFFF
+DEPTH_OFFSET = 64            #Quiescence stores negative depths
+SCORE_OFFSET = 1 << 20
+
+
+def _packMove(move):
+    if move == None:
+        return NO_MOVE
+    fromIndex, toIndex, takenIndex = move
+    return fromIndex | (toIndex << 5) | ((63 if takenIndex == None else takenIndex) << 10)
+
+
+def _unpackMove(code):
+    if code == NO_MOVE:
+        return None
+    takenIndex = code >> 10
+    return (code & 31, (code >> 5) & 31, None if takenIndex == 63 else takenIndex)
+
+
+class SharedTranspositionTable(object):
+    """Transposition table over a shared array of 64 bit words, two per entry: the key xored with the
+    data, then the data. A probe only believes an entry if the two still agree, so a torn write from
+    another process looks like a miss rather than a wrong entry and no locking is needed.
+    The last word is the generation, which only the table that made the array moves on.
+    Used the same way as search.TranspositionTable"""
+    def __init__(self, sizeBits=18, words=None):
+        """words is the shared array from another table's getWords, by default a new one is made"""
+        self._owner = words == None
+        if words == None:
+            words = multiprocessing.RawArray("Q", (2 << sizeBits) + 1)
+        self._words = words
+        self._mask = (1 << sizeBits) - 1
+        self._generationWord = 2 << sizeBits
+        self.probes = 0
+        self.hits = 0
+
+    def getWords(self):
+        return self._words
+
+    def newSearch(self):
+        if self._owner:
+            self._words[self._generationWord] = (self._words[self._generationWord] + 1) & 0xFF
+
+    def clear(self):
+        for i in range(self._generationWord):
+            self._words[i] = 0
+
+    def getSize(self):
+        return self._mask + 1
+
+    def probe(self, key):
+        """Returns (depth, flag, score, move) or None"""
+        self.probes += 1
+        slot = (key & self._mask) * 2
+        data = self._words[slot + 1]
+        if data == 0 or self._words[slot] ^ data != key:
+            return None
+        self.hits += 1
+        return ((data & 0xFF) - DEPTH_OFFSET, (data >> 8) & 3, ((data >> 10) & 0x1FFFFF) - SCORE_OFFSET,
+                _unpackMove((data >> 31) & 0xFFFF))
+
+    def store(self, key, depth, flag, score, move):
+        slot = (key & self._mask) * 2
+        generation = self._words[self._generationWord]
+        oldData = self._words[slot + 1]
+        if (oldData != 0 and self._words[slot] ^ oldData != key and (oldData >> 47) == generation
+                and depth + DEPTH_OFFSET < (oldData & 0xFF)):
+            return None
+        data = ((depth + DEPTH_OFFSET) | (flag << 8) | ((score + SCORE_OFFSET) << 10) |
+                (_packMove(move) << 31) | (generation << 47))
+        self._words[slot] = key ^ data
+        self._words[slot + 1] = data
+
+
+
+class _HelperSearch(AlphaBeta):
+    """Searches the root moves after the previous best in a random order, so helpers spread out"""
+    def __init__(self, random, table, maxDepth, tablebase):
+        AlphaBeta.__init__(self, None, maxDepth, 0, tablebase)
+        self._table = table
+        self._random = random
+
+    def _searchRoot(self, position, key, moves, depth, previousBest):
+        others = [move for move in moves if move != previousBest]
+        self._random.shuffle(others)
+        return AlphaBeta._searchRoot(self, position, key, [previousBest] + others, depth, previousBest)
+
+
+
+def _helperMain(helperNumber, words, sizeBits, maxDepth, tablebasePath, commands, results, stopEvent):
+    """Helper process entry, searches every position it is sent until the stop event is set"""
+    tablebase = None
+    if tablebasePath != None:
+        from tablebase import Tablebase
+        tablebase = Tablebase(tablebasePath)
+    search = _HelperSearch(random.Random(helperNumber), SharedTranspositionTable(sizeBits, words), maxDepth, tablebase)
+    search.stopEvent = stopEvent
+    while True:
+        command = commands.get()
+        if command[0] == "quit":
+            break
+        position, depth, timeLimit = command[1:]
+        search.timeLimit = timeLimit
+        if depth != None:
+            depth += helperNumber % 2
+        search.searchPosition(position, depth)
+        results.put((helperNumber, search.getStats()))
+    if tablebase != None:
+        tablebase.close()
+
+
+class ParallelSearch(AlphaBeta):
+    """AlphaBeta that searches on workers processes, this one included, all sharing one table.
+    The search in this process picks the move, helper processes are started once and kept for
+    every move. tablebasePath and bookPath are files rather than objects so helpers can open them too.
+    As the helpers are child processes, a ParallelSearch can not be made inside a daemon process"""
+    def __init__(self, timeLimit=1.0, workers=None, maxDepth=64, tableSizeBits=18, tablebasePath=None, bookPath=None):
+        if workers == None:
+            workers = multiprocessing.cpu_count()
+        tablebase = None
+        book = None
+        if tablebasePath != None:
+            from tablebase import Tablebase
+            tablebase = Tablebase(tablebasePath)
+        if bookPath != None:
+            from book import OpeningBook
+            book = OpeningBook(bookPath)
+        AlphaBeta.__init__(self, timeLimit, maxDepth, 0, tablebase, book)
+        self._table = SharedTranspositionTable(tableSizeBits)
+        self.workers = workers
+        self._helperStop = multiprocessing.Event()
+        self._results = multiprocessing.Queue()
+        self._helpers = []
+        for helperNumber in range(1, workers):
+            commands = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_helperMain, daemon=True,
+                                              args=(helperNumber, self._table.getWords(), tableSizeBits, maxDepth,
+                                                    tablebasePath, commands, self._results, self._helperStop))
+            process.start()
+            self._helpers.append((process, commands))
+
+
+    def searchPosition(self, position, depth=None):
+        """Same as AlphaBeta.searchPosition, helpers search alongside and are stopped as soon as it returns.
+        The stats count nodes over every worker, mainNodes is this process's share"""
+        if positionMoves(position) == []:
+            return None
+        self._helperStop.clear()
+        startTime = time.perf_counter()
+        for process, commands in self._helpers:
+            commands.put(("search", position, depth, self.timeLimit))
+        move = AlphaBeta.searchPosition(self, position, depth)
+        self._helperStop.set()
+        helperStats = [self._results.get()[1] for helper in self._helpers]
+        elapsed = time.perf_counter() - startTime
+        stats = dict(self._stats)
+        stats["mainNodes"] = stats["nodes"]
+        stats["nodes"] += sum(helper["nodes"] for helper in helperStats)
+        stats["seconds"] = elapsed
+        stats["nodesPerSecond"] = stats["nodes"] / elapsed if elapsed > 0 else 0.0
+        stats["helperDepths"] = [helper["depth"] for helper in helperStats]
+        stats["workers"] = self.workers
+        self._stats = stats
+        return move
+
+
+    def close(self):
+        """Stops the helper processes and closes the tablebase and book files"""
+        for process, commands in self._helpers:
+            commands.put(("quit",))
+        for process, commands in self._helpers:
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+        self._helpers = []
+        if self._tablebase != None:
+            self._tablebase.close()
+        if self._book != None:
+            self._book.close()
+
+
+def _testPositions(count, seed=0):
+    """Returns positions from random games, a few moves in so they are not all the same"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = Engine()
+        game.newGame()
+        for i in range(rng.randrange(4, 20)):
+            if game.getWinner() != None:
+                break
+            game.makeMove(*rng.choice(game.getLegalMoves())[:4])
+        if game.getWinner() == None:
+            positions.append(game.getPosition())
+    return positions
+
+
+def measureSpeedup(depth, workerCounts, positionCount=8, tableSizeBits=18, seed=0):
+    """Searches the same positions to a fixed depth with each worker count, starting each count
+    with an empty table. Returns a list of dicts with seconds and speedup against the first count"""
+    positions = _testPositions(positionCount, seed)
+    report = []
+    for workers in workerCounts:
+        search = ParallelSearch(None, workers, tableSizeBits=tableSizeBits)
+        nodes = 0
+        startTime = time.perf_counter()
+        for position in positions:
+            search.searchPosition(position, depth)
+            nodes += search.getStats()["nodes"]
+        elapsed = time.perf_counter() - startTime
+        search.close()
+        report.append({"workers": workers, "depth": depth, "positions": len(positions), "seconds": elapsed,
+                       "nodes": nodes, "speedup": report[0]["seconds"] / elapsed if report != [] else 1.0})
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how much faster the parallel search reaches a fixed depth")
+    parser.add_argument("--depth", type=int, default=7)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--positions", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for line in measureSpeedup(args.depth, args.workers, args.positions, seed=args.seed):
+        print(json.dumps(line))
@@ -0,0 +1,328 @@
+"""Portable Draughts Notation export, a streaming parser and bulk validation of game archives.
+Squares are numbered 1 to 32 in engine square order, so 1-4 is White's back row and
+White moves first. A combo is written as one move, like 9x18x27"""
+import argparse, itertools, json, multiprocessing, os, random, re, sys, time
+from engine import Engine, squareIndex, squareCoords
+
+
+RESULT_TOKENS = ("1-0", "0-1", "1/2-1/2", "*")
+MOVE_PATTERN = re.compile(r"^\d+(?:[-x]\d+)+$")
+MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+$")
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]$')
+LINE_WIDTH = 79
+
+
+def squareNumber(x, y):
+    return squareIndex(x, y) + 1
+
+
+def numberCoords(number):
+    return squareCoords(number - 1)
+
+
+def turnsFromHistory(history):
+    """history is a list of (xFrom, yFrom, xTo, yTo, taking, whiteMoved) as from Engine.getMoveHistory,
+    returns list of move strings with each combo joined into one move"""
+    turns = []
+    previous = None
+    for xFrom, yFrom, xTo, yTo, taking, whiteMoved in history:
+        if previous != None and previous[0] == whiteMoved and previous[1] and taking and previous[2] == (xFrom, yFrom):
+            turns[-1] += "x" + str(squareNumber(xTo, yTo))
+        elif taking:
+            turns.append(str(squareNumber(xFrom, yFrom)) + "x" + str(squareNumber(xTo, yTo)))
+        else:
+            turns.append(str(squareNumber(xFrom, yFrom)) + "-" + str(squareNumber(xTo, yTo)))
+        previous = (whiteMoved, taking, (xTo, yTo))
+    return turns
+
+
+def formatGame(turns, tags, result="*"):
+    """turns is a list of move strings, tags a dict of tag names to values, returns the game as PDN text"""
+    lines = ['[%s "%s"]' % (name, str(value).replace('"', "'")) for name, value in tags.items()]
+    lines.append("")
+    tokens = []
+    for number, turn in enumerate(turns):
+        if number % 2 == 0:
+            tokens.append(str(number // 2 + 1) + ".")
+        tokens.append(turn)
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line != "" and len(line) + 1 + len(token) > LINE_WIDTH:
+            lines.append(line)
+            line = token
+        elif line == "":
+            line = token
+        else:
+            line += " " + token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def exportGame(game, white="White", black="Black", event="Casual game"):
+    """game is an Engine, returns the moves played so far as PDN text"""
+    winner = game.getWinner()
+    if winner == None:
+        result = "*"
+    elif winner == game.getPlayers()[0]:
+        result = "1-0"
+    else:
+        result = "0-1"
+    tags = {"Event": event, "White": white, "Black": black, "Result": result}
+    return formatGame(turnsFromHistory(game.getMoveHistory()), tags, result)
+
+
+def _movetextTokens(line, state):
+    """Splits a movetext line into tokens, state is a dict carrying comment and variation depth between lines"""
+    tokens = []
+    token = ""
+    for character in line:
+        if state["comment"]:
+            if character == "}":
+                state["comment"] = False
+            continue
+        if character == "{":
+            state["comment"] = True
+        elif character == "(":
+            state["variation"] += 1
+        elif character == ")":
+            state["variation"] = max(0, state["variation"] - 1)
+        elif character == ";":
+            break                      #Rest of the line is a comment
+        elif state["variation"] > 0:
+            continue
+        elif character.isspace():
+            if token != "":
+                tokens.append(token)
+            token = ""
+            continue
+        else:
+            token += character
+            continue
+        if token != "":
+            tokens.append(token)
+        token = ""
+    if token != "":
+        tokens.append(token)
+    return tokens
+
+
+def readGames(lines):
+    """lines is any iterable of text lines, such as an open file. Yields one dict per game with
+    tags, moves (list of move strings) and result, reading only as far as the next game"""
+    tags = {}
+    moves = []
+    inMovetext = False
+    state = {"comment": False, "variation": 0}
+    for line in lines:
+        stripped = line.strip()
+        if not state["comment"] and state["variation"] == 0:
+            match = TAG_PATTERN.match(stripped)
+            if match != None:
+                if inMovetext:             #A tag after moves starts the next game
+                    yield {"tags": tags, "moves": moves, "result": tags.get("Result", "*")}
+                    tags = {}
+                    moves = []
+                    inMovetext = False
+                tags[match.group(1)] = match.group(2)
+                continue
+        for token in _movetextTokens(stripped, state):
+            if token in RESULT_TOKENS:
+                yield {"tags": tags, "moves": moves, "result": token}
+                tags = {}
+                moves = []
+                inMovetext = False
+                continue
+            inMovetext = True
+            if MOVE_NUMBER_PATTERN.match(token) or token.startswith("$"):
+                continue
+            if "." in token:               #Move number written straight onto the move, like 1.11-15
+                token = token.split(".")[-1]
+                if token == "":
+                    continue
+            moves.append(token)
+    if inMovetext or moves != []:
+        yield {"tags": tags, "moves": moves, "result": tags.get("Result", "*")}
+
+
+def _playTurn(game, start, targets, taking):
+    """Plays the turn that starts on square start and lands on exactly the squares in targets.
+    Failing that, short notation may leave out squares a capture passes through, as long as only
+    one turn lands on every square in targets in order, finishing on the last.
+    Returns False if there is no such turn, or the short notation could be more than one"""
+    shortMatches = []
+    for turn in game.getLegalTurns():
+        if squareNumber(turn[0][0], turn[0][1]) != start or turn[0][4] != taking:
+            continue
+        landings = [squareNumber(move[2], move[3]) for move in turn]
+        if landings == targets:
+            game.makeTurn(turn)
+            return True
+        remaining = iter(landings)
+        if landings[-1] == targets[-1] and all(target in remaining for target in targets):
+            shortMatches.append(turn)
+    if len(shortMatches) != 1:
+        return False
+    game.makeTurn(shortMatches[0])
+    return True
+
+
+def _playUnfinishedTurn(game, start, targets):
+    """Plays the jumps in targets when they are the start of a combo that has not been finished,
+    as exportGame writes for a game saved partway through one. Leaves the game waiting for the
+    rest of the combo and returns False if no legal turn starts with those jumps"""
+    for turn in game.getLegalTurns():
+        if squareNumber(turn[0][0], turn[0][1]) != start or not turn[0][4] or len(turn) <= len(targets):
+            continue
+        if [squareNumber(move[2], move[3]) for move in turn[:len(targets)]] == targets:
+            for move in turn[:len(targets)]:
+                game.makeMove(*move[:4])
+            return True
+    return False
+
+
+def playMove(game, move, last=True):
+    """Plays one move string on game, returns None if it was played or why it could not be.
+    last allows a combo cut short, as replayGame does for the final move of a game"""
+    if not MOVE_PATTERN.match(move):
+        return "is not a move"
+    taking = "x" in move
+    squares = [int(square) for square in re.split("[-x]", move)]
+    if any(square < 1 or square > 32 for square in squares):
+        return "is off the board"
+    if game.getWinner() != None:
+        return "is not legal"
+    if _playTurn(game, squares[0], squares[1:], taking):
+        return None
+    if not last or not taking or not _playUnfinishedTurn(game, squares[0], squares[1:]):
+        return "is not legal"
+    return None
+
+
+def replayGame(moves, game=None):
+    """Plays move strings through the rules, returns (valid, error, game).
+    A move is only valid if it is legal, taking when it must and carrying a combo on until it ends,
+    except that the last move may be a combo cut short, which leaves the game partway through it"""
+    if game == None:
+        game = Engine()
+    game.newGame()
+    for number, move in enumerate(moves):
+        error = playMove(game, move, number == len(moves) - 1)
+        if error != None:
+            return (False, "move %d %r %s" % (number + 1, move, error), game)
+    return (True, None, game)
+
+
+def validateGame(numberedGame):
+    """numberedGame is (gameNumber, game dict from readGames), returns a dict describing whether it is legal"""
+    gameNumber, parsedGame = numberedGame
+    valid, error, game = replayGame(parsedGame["moves"])
+    if valid:
+        winner = game.getWinner()
+        if parsedGame["result"] == "1-0" and winner == game.getPlayers()[1]:
+            valid, error = False, "result is 1-0 but Black won"
+        elif parsedGame["result"] == "0-1" and winner == game.getPlayers()[0]:
+            valid, error = False, "result is 0-1 but White won"
+    return {"game": gameNumber, "valid": valid, "error": error, "moves": len(parsedGame["moves"])}
+
+
+def validateArchive(path, workers=None, batchSize=4096, onResult=None):
+    """Replays every game in a PDN file on a pool of workers processes, reading the file in
+    batches of batchSize games so the whole archive is never in memory.
+    onResult is called with each game's result dict. Returns a summary dict with gamesPerSecond"""
+    if workers == None:
+        workers = os.cpu_count() or 1
+    summary = {"games": 0, "valid": 0, "invalid": 0}
+    startTime = time.perf_counter()
+    with open(path) as archive, multiprocessing.Pool(workers) as pool:
+        games = enumerate(readGames(archive))
+        while True:
+            batch = list(itertools.islice(games, batchSize))
+            if batch == []:
+                break
+            chunksize = max(1, len(batch) // (workers * 4))
+            for result in pool.imap_unordered(validateGame, batch, chunksize):
+                summary["games"] += 1
+                if result["valid"]:
+                    summary["valid"] += 1
+                else:
+                    summary["invalid"] += 1
+                if onResult != None:
+                    onResult(result)
+    elapsed = time.perf_counter() - startTime
+    summary["seconds"] = elapsed
+    summary["gamesPerSecond"] = summary["games"] / elapsed if elapsed > 0 else 0.0
+    return summary
+
+
+def checkRoundTrip(games, seed=0, maxTurns=200):
+    """Exports random games with exportGame, reads them back with readGames and replays them.
+    Returns a list of (gameNumber, error) for every game that did not come back the same"""
+    rng = random.Random(seed)
+    failures = []
+    for gameNumber in range(games):
+        game = Engine()
+        game.newGame()
+        for turnNumber in range(rng.randrange(1, maxTurns)):
+            turns = game.getLegalTurns()
+            if turns == []:
+                break
+            game.makeTurn(rng.choice(turns))
+        moves = game.getLegalMoves()
+        if moves != [] and moves[0][4] and rng.random() < 0.5:
+            #Stop partway through a combo now and then, as when saving mid turn
+            move = rng.choice(moves)
+            game.makeMove(*move[:4])
+        parsedGame = next(readGames(exportGame(game).splitlines()))
+        valid, error, replayed = replayGame(parsedGame["moves"])
+        if not valid:
+            failures.append((gameNumber, error))
+        elif replayed.getMoveHistory() != game.getMoveHistory() or replayed.getPosition() != game.getPosition():
+            failures.append((gameNumber, "replayed to a different game"))
+    return failures
+
+
+def convertSelfPlay(resultsPath, outputPath):
+    """Writes the games in a selfplay.py results file made with --record-moves out as PDN"""
+    with open(resultsPath) as resultsFile, open(outputPath, "w") as outputFile:
+        for line in resultsFile:
+            result = json.loads(line)
+            history = []
+            whiteMoved = True
+            for fromIndex, toIndex, takenIndex in result["moveList"]:
+                if history != [] and not (history[-1][4] and takenIndex != None and
+                                          history[-1][2:4] == squareCoords(fromIndex)):
+                    whiteMoved = not whiteMoved        #A new turn unless this carries on a combo
+                history.append(squareCoords(fromIndex) + squareCoords(toIndex) + (takenIndex != None, whiteMoved))
+            outcome = {"White": "1-0", "Black": "0-1", None: "*"}[result["winner"]]
+            tags = {"Event": "Self play game " + str(result["game"]), "White": result["white"],
+                    "Black": result["black"], "Result": outcome}
+            outputFile.write(formatGame(turnsFromHistory(history), tags, outcome))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate PDN game archives, convert self play games to PDN or check export round trips")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    validateParser = subparsers.add_parser("validate", help="replay every game in a PDN file")
+    validateParser.add_argument("archive")
+    validateParser.add_argument("--workers", type=int, default=None)
+    convertParser = subparsers.add_parser("convert", help="write selfplay.py --record-moves games as PDN")
+    convertParser.add_argument("results")
+    convertParser.add_argument("--output", default="games.pdn")
+    roundTripParser = subparsers.add_parser("roundtrip", help="check random games come back the same after export and replay")
+    roundTripParser.add_argument("--games", type=int, default=300)
+    roundTripParser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "validate":
+        def reportInvalid(result):
+            if not result["valid"]:
+                print("game", result["game"], result["error"])
+        print(json.dumps(validateArchive(args.archive, args.workers, onResult=reportInvalid)))
+    elif args.command == "roundtrip":
+        failures = checkRoundTrip(args.games, args.seed)
+        for gameNumber, error in failures:
+            print("game", gameNumber, error)
+        print(json.dumps({"games": args.games, "failed": len(failures)}))
+        sys.exit(1 if failures else 0)
+    else:
+        convertSelfPlay(args.results, args.output)
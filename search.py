@@ -0,0 +1,340 @@
+"""Alpha-beta computer player, searches positions from engine.getPosition with
+iterative deepening, a Zobrist hashed transposition table and killer/history move ordering"""
+import random, time
+from engine import positionMoves, playPositionMove, bitIndices, countBits, squareCoords
+from tablebase import WIN, LOSS
+
+
+WIN_SCORE = 100000
+MAX_PLY = 128
+MAN_VALUE = 100
+KING_VALUE = 170
+ADVANCE_VALUE = 2            #Per row a man has moved up the board
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+TIME_CHECK_NODES = 2047      #Nodes between checks of the clock, must be one less than a power of 2
+
+
+#Keys for white men, white kings, black men, black kings on each square, then side to move and forced square
+_zobristRandom = random.Random(2718281828)
+ZOBRIST_PIECES = [[_zobristRandom.getrandbits(64) for index in range(32)] for pieceType in range(4)]
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_FORCED = [_zobristRandom.getrandbits(64) for index in range(32)]
+
+#Bitboards of the rows, used to reward men for advancing
+ROWS = [0xF << (row * 4) for row in range(8)]
+
+
+def _pieceMasks(position):
+    """Returns white men, white kings, black men, black kings bitboards"""
+    white, black, kings = position[0], position[1], position[2]
+    return (white & ~kings, white & kings, black & ~kings, black & kings)
+
+
+def zobristHash(position):
+    """Returns the 64 bit Zobrist key of a position tuple"""
+    key = 0
+    for pieceType, mask in enumerate(_pieceMasks(position)):
+        for index in bitIndices(mask):
+            key ^= ZOBRIST_PIECES[pieceType][index]
+    if not position[3]:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    if position[4] != None:
+        key ^= ZOBRIST_FORCED[position[4]]
+    return key
+
+
+def _updateHash(key, position, child):
+    """Returns the key of child given the key of its parent position"""
+    for pieceType, before, after in zip(range(4), _pieceMasks(position), _pieceMasks(child)):
+        for index in bitIndices(before ^ after):
+            key ^= ZOBRIST_PIECES[pieceType][index]
+    if position[3] != child[3]:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    if position[4] != None:
+        key ^= ZOBRIST_FORCED[position[4]]
+    if child[4] != None:
+        key ^= ZOBRIST_FORCED[child[4]]
+    return key
+
+
+def evaluate(position):
+    """Returns a score for the side to move, material plus a small bonus for advanced men"""
+    whiteMen, whiteKings, blackMen, blackKings = _pieceMasks(position)
+    score = MAN_VALUE * (countBits(whiteMen) - countBits(blackMen))
+    score += KING_VALUE * (countBits(whiteKings) - countBits(blackKings))
+    for row in range(1, 7):
+        score += ADVANCE_VALUE * row * countBits(whiteMen & ROWS[row])
+        score -= ADVANCE_VALUE * (7 - row) * countBits(blackMen & ROWS[row])
+    if position[3]:
+        return score
+    else:
+        return -score
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class TranspositionTable(object):
+    """Fixed size table indexed by the low bits of the Zobrist key.
+    An entry is replaced when it is from an older search or the new entry is at least as deep"""
+    def __init__(self, sizeBits=18):
+        self._mask = (1 << sizeBits) - 1
+        self._entries = [None] * (1 << sizeBits)
+        self._generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def newSearch(self):
+        """Ages existing entries so they are replaced first"""
+        self._generation += 1
+
+    def clear(self):
+        self._entries = [None] * len(self._entries)
+
+    def getSize(self):
+        return len(self._entries)
+
+    def probe(self, key):
+        """Returns (depth, flag, score, move) or None"""
+        self.probes += 1
+        entry = self._entries[key & self._mask]
+        if entry != None and entry[0] == key:
+            self.hits += 1
+            return entry[2:]
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        slot = key & self._mask
+        entry = self._entries[slot]
+        if entry == None or entry[0] == key or entry[1] != self._generation or depth >= entry[2]:
+            self._entries[slot] = (key, self._generation, depth, flag, score, move)
+
+
+class AlphaBeta(object):
+    """Computer player, timeLimit is the number of seconds it may think for each move, None for no limit.
+    tablebase is an optional tablebase.Tablebase used to score endgames exactly and
+    book an optional book.OpeningBook whose moves are played without searching.
+    stopEvent can be set to anything with an is_set method, such as a threading.Event, to stop a
+    search early, and onProgress to a function called with (depth, score, move, nodes) after each depth"""
+    def __init__(self, timeLimit=1.0, maxDepth=64, tableSizeBits=18, tablebase=None, book=None):
+        self.timeLimit = timeLimit
+        self.maxDepth = maxDepth
+        self._table = TranspositionTable(tableSizeBits)
+        self._tablebase = tablebase
+        self._tablebaseHits = 0
+        self._book = book
+        self._killers = [[None, None] for ply in range(MAX_PLY)]
+        self._history = [[0] * 32 for index in range(32)]
+        self._nodes = 0
+        self._deadline = None
+        self._stats = {}
+        self.stopEvent = None
+        self.onProgress = None
+
+
+    def chooseMove(self, game):
+        """game is an Engine, returns (xFrom, yFrom, xTo, yTo, taking) to play"""
+        fromIndex, toIndex, takenIndex = self.searchPosition(game.getPosition())
+        return squareCoords(fromIndex) + squareCoords(toIndex) + (takenIndex != None,)
+
+
+    def searchPosition(self, position, depth=None):
+        """Returns the best move (fromIndex, toIndex, takenIndex) found for the side to move,
+        searches to depth if given, otherwise deepens until the time limit runs out"""
+        moves = positionMoves(position)
+        if moves == []:
+            return None
+        if self._book != None and depth == None:
+            bookMove = self._book.chooseMove(position)
+            if bookMove != None:
+                self._stats = {"nodes": 0, "seconds": 0.0, "nodesPerSecond": 0.0, "depth": 0, "score": 0,
+                               "ttProbes": 0, "ttHits": 0, "ttHitRate": 0.0, "tablebaseHits": 0, "book": True}
+                return bookMove
+        self._nodes = 0
+        self._table.newSearch()
+        self._table.probes = 0
+        self._table.hits = 0
+        self._tablebaseHits = 0
+        self._killers = [[None, None] for ply in range(MAX_PLY)]
+        for row in self._history:
+            for i in range(32):
+                row[i] //= 8
+        startTime = time.perf_counter()
+        if depth == None:
+            self._deadline = None if self.timeLimit == None else startTime + self.timeLimit
+            maxDepth = self.maxDepth
+        else:
+            self._deadline = None
+            maxDepth = depth
+        key = zobristHash(position)
+        bestMove = moves[0]
+        bestScore = 0
+        completedDepth = 0
+        if len(moves) > 1 or depth != None:
+            for currentDepth in range(1, maxDepth + 1):
+                try:
+                    bestScore, bestMove = self._searchRoot(position, key, moves, currentDepth, bestMove)
+                except _SearchTimeout:
+                    break
+                completedDepth = currentDepth
+                if self.onProgress != None:
+                    self.onProgress(currentDepth, bestScore, bestMove, self._nodes)
+                if abs(bestScore) >= WIN_SCORE - MAX_PLY:
+                    break
+        elapsed = time.perf_counter() - startTime
+        self._stats = {"nodes": self._nodes,
+                       "seconds": elapsed,
+                       "nodesPerSecond": self._nodes / elapsed if elapsed > 0 else 0.0,
+                       "depth": completedDepth,
+                       "score": bestScore,
+                       "ttProbes": self._table.probes,
+                       "ttHits": self._table.hits,
+                       "ttHitRate": self._table.hits / self._table.probes if self._table.probes else 0.0,
+                       "tablebaseHits": self._tablebaseHits,
+                       "book": False}
+        return bestMove
+
+
+    def getStats(self):
+        """Returns a dict describing the last search, nodes, nodesPerSecond, depth and table hit rate"""
+        return dict(self._stats)
+
+
+    def setDeadline(self, seconds):
+        """Gives the search that is running seconds from now to finish, can be called from another thread"""
+        self._deadline = time.perf_counter() + seconds
+
+
+    def getTableMove(self, position):
+        """Returns the move the transposition table has for position if it is legal there, otherwise None"""
+        entry = self._table.probe(zobristHash(position))
+        if entry != None and entry[3] in positionMoves(position):
+            return entry[3]
+        return None
+
+
+    def _searchRoot(self, position, key, moves, depth, previousBest):
+        alpha = -WIN_SCORE - 1
+        beta = WIN_SCORE + 1
+        ordered = [previousBest] + [move for move in moves if move != previousBest]
+        bestMove = ordered[0]
+        for move in ordered:
+            score = self._searchChild(position, key, move, depth, alpha, beta, 0)
+            if score > alpha:
+                alpha = score
+                bestMove = move
+        self._table.store(key, depth, EXACT, alpha, bestMove)
+        return (alpha, bestMove)
+
+
+    def _searchChild(self, position, key, move, depth, alpha, beta, ply):
+        """Plays move and searches the result, a combo carries on at the same depth for the same side"""
+        child = playPositionMove(position, move)
+        childKey = _updateHash(key, position, child)
+        if child[3] == position[3]:
+            return self._negamax(child, childKey, depth, alpha, beta, ply + 1)
+        else:
+            return -self._negamax(child, childKey, depth - 1, -beta, -alpha, ply + 1)
+
+
+    def _negamax(self, position, key, depth, alpha, beta, ply):
+        self._nodes += 1
+        if self._nodes & TIME_CHECK_NODES == 0:
+            if self._deadline != None and time.perf_counter() > self._deadline:
+                raise _SearchTimeout()
+            if self.stopEvent != None and self.stopEvent.is_set():
+                raise _SearchTimeout()
+        moves = positionMoves(position)
+        if moves == []:
+            return -WIN_SCORE + ply
+        if self._tablebase != None and position[4] == None:
+            found = self._tablebase.probe(position)
+            if found != None:
+                self._tablebaseHits += 1
+                return self._tablebaseScore(found, ply)
+        if ply >= MAX_PLY - 1 or (depth <= 0 and moves[0][2] == None):   #Keep going while taking is forced
+            return evaluate(position)
+        originalAlpha = alpha
+        tableMove = None
+        entry = self._table.probe(key)
+        if entry != None:
+            entryDepth, flag, score, tableMove = entry
+            if entryDepth >= depth:
+                if score > WIN_SCORE - MAX_PLY:         #Win scores are stored relative to this position
+                    score -= ply
+                elif score < -WIN_SCORE + MAX_PLY:
+                    score += ply
+                if flag == EXACT:
+                    return score
+                elif flag == LOWER_BOUND and score > alpha:
+                    alpha = score
+                elif flag == UPPER_BOUND and score < beta:
+                    beta = score
+                if alpha >= beta:
+                    return score
+        bestScore = -WIN_SCORE - 1
+        bestMove = None
+        for move in self._orderMoves(moves, tableMove, ply):
+            score = self._searchChild(position, key, move, depth, alpha, beta, ply)
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if move[2] == None:
+                            self._recordCutoff(move, depth, ply)
+                        break
+        if bestScore <= originalAlpha:
+            flag = UPPER_BOUND
+        elif bestScore >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        storedScore = bestScore
+        if storedScore > WIN_SCORE - MAX_PLY:
+            storedScore += ply
+        elif storedScore < -WIN_SCORE + MAX_PLY:
+            storedScore -= ply
+        self._table.store(key, depth, flag, storedScore, bestMove)
+        return bestScore
+
+
+    def _tablebaseScore(self, found, ply):
+        """Turns a (result, turns) tablebase entry into a search score"""
+        result, turns = found
+        if result == WIN:
+            return max(WIN_SCORE - ply - turns, WIN_SCORE - MAX_PLY + 1)
+        elif result == LOSS:
+            return min(-WIN_SCORE + ply + turns, -WIN_SCORE + MAX_PLY - 1)
+        return 0
+
+
+    def _orderMoves(self, moves, tableMove, ply):
+        """Table move first, then killer moves, then by history score"""
+        if len(moves) == 1:
+            return moves
+        killers = self._killers[ply]
+        history = self._history
+
+        def moveOrder(move):
+            if move == tableMove:
+                return 1 << 40
+            if move == killers[0]:
+                return 1 << 39
+            if move == killers[1]:
+                return 1 << 38
+            return history[move[0]][move[1]]
+        return sorted(moves, key=moveOrder, reverse=True)
+
+
+    def _recordCutoff(self, move, depth, ply):
+        killers = self._killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        if depth > 0:
+            self._history[move[0]][move[1]] += depth * depth
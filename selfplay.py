@@ -0,0 +1,171 @@
+"""Plays batches of computer vs computer games across a process pool and streams
+one JSON line per finished game to a results file"""
+import argparse, json, multiprocessing, os, random, time
+from engine import Engine, positionMoves, playPositionMove
+from search import AlphaBeta, evaluate
+from mcts import MonteCarlo
+
+
+POLICY_NAMES = ("random", "greedy", "search", "mcts")
+
+
+class RandomPolicy(object):
+    """Picks any legal move"""
+    def __init__(self, rng):
+        self._rng = rng
+
+    def chooseMove(self, position, moves):
+        return self._rng.choice(moves)
+
+
+class GreedyCapturePolicy(object):
+    """Picks the move that leaves the best material for the mover straight after it,
+    so it carries on combos and kings pieces when it can, ties are broken randomly"""
+    def __init__(self, rng):
+        self._rng = rng
+
+    def chooseMove(self, position, moves):
+        bestScore = None
+        bestMoves = []
+        for move in moves:
+            child = playPositionMove(position, move)
+            score = evaluate(child)
+            if child[3] != position[3]:
+                score = -score
+            if bestScore == None or score > bestScore:
+                bestScore = score
+                bestMoves = [move]
+            elif score == bestScore:
+                bestMoves.append(move)
+        return self._rng.choice(bestMoves)
+
+
+class SearchPolicy(object):
+    """Uses the alpha-beta search, to a fixed depth if depth is given, otherwise for timeLimit seconds.
+    The search has no randomness, so unlike the other policies it takes no rng"""
+    def __init__(self, depth=None, timeLimit=0.1):
+        self._search = AlphaBeta(timeLimit)
+        self._depth = depth
+
+    def chooseMove(self, position, moves):
+        return self._search.searchPosition(position, self._depth)
+
+
+class MonteCarloPolicy(object):
+    """Uses the Monte Carlo tree search for timeLimit seconds, so it can be compared with
+    the search policy at the same time per move"""
+    def __init__(self, rng, timeLimit=0.1):
+        self._search = MonteCarlo(timeLimit, seed=rng.random())
+
+    def chooseMove(self, position, moves):
+        return self._search.searchPosition(position)
+
+
+def makePolicy(name, rng, searchDepth=None, searchTime=0.1):
+    """name is one of POLICY_NAMES"""
+    if name == "random":
+        return RandomPolicy(rng)
+    elif name == "greedy":
+        return GreedyCapturePolicy(rng)
+    elif name == "search":
+        return SearchPolicy(searchDepth, searchTime)
+    elif name == "mcts":
+        return MonteCarloPolicy(rng, searchTime)
+    raise ValueError("Unknown policy " + repr(name))
+
+
+def playGame(settings):
+    """settings is a tuple of (gameNumber, whitePolicy, blackPolicy, seed, maxMoves, searchDepth, searchTime, recordMoves),
+    plays one game and returns a dict of its result, winner is None if maxMoves was reached.
+    With recordMoves the result also has moveList, every (fromIndex, toIndex, takenIndex) played in order"""
+    gameNumber, whiteName, blackName, seed, maxMoves, searchDepth, searchTime, recordMoves = settings
+    rng = random.Random(seed)
+    policies = {True: makePolicy(whiteName, rng, searchDepth, searchTime),
+                False: makePolicy(blackName, rng, searchDepth, searchTime)}
+    startGame = Engine()
+    startGame.newGame()
+    position = startGame.getPosition()
+    captures = {True: 0, False: 0}
+    kingsMade = {True: 0, False: 0}
+    moveCount = 0
+    moveList = []
+    startTime = time.perf_counter()
+    moves = positionMoves(position)
+    while moves and moveCount < maxMoves:
+        whiteToMove = position[3]
+        move = policies[whiteToMove].chooseMove(position, moves)
+        child = playPositionMove(position, move)
+        if recordMoves:
+            moveList.append(move)
+        if move[2] != None:
+            captures[whiteToMove] += 1
+        if (child[2] >> move[1]) & 1 and not (position[2] >> move[0]) & 1:
+            kingsMade[whiteToMove] += 1
+        if child[3] != whiteToMove:            #A combo only counts as one move
+            moveCount += 1
+        position = child
+        moves = positionMoves(position)
+    if moves:
+        winner = None
+    elif position[3]:
+        winner = "Black"
+    else:
+        winner = "White"
+    result = {"game": gameNumber,
+              "white": whiteName,
+              "black": blackName,
+              "winner": winner,
+              "moves": moveCount,
+              "whiteCaptures": captures[True],
+              "blackCaptures": captures[False],
+              "whiteKings": kingsMade[True],
+              "blackKings": kingsMade[False],
+              "seconds": time.perf_counter() - startTime}
+    if recordMoves:
+        result["moveList"] = moveList
+    return result
+
+
+def runSelfPlay(games, whitePolicy, blackPolicy, outputPath, workers=None, seed=0,
+                maxMoves=200, searchDepth=None, searchTime=0.1, recordMoves=False):
+    """Plays games on a pool of workers processes, writing each result to outputPath as it finishes.
+    Returns a summary dict with win counts and games per second"""
+    if workers == None:
+        workers = os.cpu_count() or 1
+    settings = [(number, whitePolicy, blackPolicy, seed + number, maxMoves, searchDepth, searchTime, recordMoves)
+                for number in range(games)]
+    chunksize = max(1, games // (workers * 16))
+    summary = {"games": 0, "White": 0, "Black": 0, "draws": 0}
+    startTime = time.perf_counter()
+    with open(outputPath, "w") as outputFile, multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(playGame, settings, chunksize):
+            outputFile.write(json.dumps(result) + "\n")
+            outputFile.flush()
+            summary["games"] += 1
+            if result["winner"] == None:
+                summary["draws"] += 1
+            else:
+                summary[result["winner"]] += 1
+    elapsed = time.perf_counter() - startTime
+    summary["seconds"] = elapsed
+    summary["gamesPerSecond"] = summary["games"] / elapsed if elapsed > 0 else 0.0
+    summary["workers"] = workers
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play batches of checkers games between computer policies")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--white", choices=POLICY_NAMES, default="random")
+    parser.add_argument("--black", choices=POLICY_NAMES, default="random")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to one per core")
+    parser.add_argument("--output", default="selfplay.jsonl", help="file results are streamed to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-moves", type=int, default=200, help="moves before a game is called a draw")
+    parser.add_argument("--search-depth", type=int, default=None, help="fixed depth for the search policy")
+    parser.add_argument("--search-time", type=float, default=0.1, help="seconds per move for the search and mcts policies")
+    parser.add_argument("--record-moves", action="store_true", help="include every move played in the results")
+    args = parser.parse_args()
+    summary = runSelfPlay(args.games, args.white, args.black, args.output, args.workers, args.seed,
+                          args.max_moves, args.search_depth, args.search_time, args.record_moves)
+    print(json.dumps(summary))
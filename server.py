@@ -0,0 +1,364 @@
+"""asyncio server hosting many games at once over TCP, with a load test client.
+Every message is one JSON object on its own line. Clients send:
+    {"type": "join"}                                  wait for an opponent, or join the longest waiting game
+    {"type": "move", "move": [xFrom, yFrom, xTo, yTo]} one jump of a combo is one move, as in Engine.makeMove
+    {"type": "state"}                                 ask for the whole board again
+    {"type": "leave"}                                 give up the game
+The server sends joined, start, diff, state, left and error messages. Boards are 32 character
+strings in engine square order, w and b for men, W and B for kings and . for empty squares.
+A diff only lists the squares that changed, as [square index, character] pairs"""
+import argparse, asyncio, itertools, json, random, time
+from engine import Engine, SQUARE_COUNT, squareCoords
+
+
+LINE_LIMIT = 4096          #Longest line a client may send
+COLOURS = ("white", "black")
+
+
+def boardString(position):
+    white, black, kings = position[0], position[1], position[2]
+    squares = []
+    for index in range(SQUARE_COUNT):
+        bit = 1 << index
+        if white & bit:
+            squares.append("W" if kings & bit else "w")
+        elif black & bit:
+            squares.append("B" if kings & bit else "b")
+        else:
+            squares.append(".")
+    return "".join(squares)
+
+
+def boardDiff(before, after):
+    """before and after are board strings, returns list of [index, character] for squares that changed"""
+    return [[index, after[index]] for index in range(SQUARE_COUNT) if before[index] != after[index]]
+
+
+def _colourOf(game, player):
+    if player == None:
+        return None
+    return COLOURS[game.getPlayers().index(player)]
+
+
+class Match(object):
+    """One game on the server and the connections playing it"""
+    __slots__ = ("matchId", "game", "board", "connections", "finished")
+
+    def __init__(self, matchId):
+        self.matchId = matchId
+        self.game = Engine()
+        self.game.newGame()
+        self.board = boardString(self.game.getPosition())
+        self.connections = {}       #Colour to Connection
+        self.finished = False
+
+
+    def getState(self):
+        position = self.game.getPosition()
+        forced = None
+        if position[4] != None:
+            forced = squareCoords(position[4])
+        return {"type": "state", "game": self.matchId, "board": self.board, "turn": COLOURS[0 if position[3] else 1],
+                "forced": forced, "winner": _colourOf(self.game, self.game.getWinner())}
+
+
+
+class Connection(object):
+    __slots__ = ("writer", "match", "colour")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.match = None
+        self.colour = None
+
+
+    def send(self, message):
+        """Queues a message without waiting, a client that stops reading only fills its own buffer"""
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+
+class GameServer(object):
+    """Pairs clients up into matches and checks every move against the rules before passing it on"""
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self._matches = {}
+        self._waiting = None        #Match with only a white player
+        self._matchIds = itertools.count(1)
+        self._server = None
+        self._stats = {"connections": 0, "connectionsOpen": 0, "movesPlayed": 0, "movesRejected": 0, "gamesFinished": 0}
+        self._handlers = {"join": self._onJoin, "move": self._onMove, "state": self._onState,
+                          "leave": self._onLeave, "stats": self._onStats}
+
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handleConnection, self.host, self.port, limit=LINE_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]    #Port 0 picks a free port
+        return self._server
+
+
+    async def serveForever(self):
+        if self._server == None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+
+    def close(self):
+        if self._server != None:
+            self._server.close()
+
+
+    def getStats(self):
+        stats = dict(self._stats)
+        stats["matches"] = len(self._matches)
+        return stats
+
+
+    async def _handleConnection(self, reader, writer):
+        connection = Connection(writer)
+        self._stats["connections"] += 1
+        self._stats["connectionsOpen"] += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:              #Line longer than LINE_LIMIT
+                    connection.send({"type": "error", "message": "line too long"})
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    connection.send({"type": "error", "message": "not JSON"})
+                    continue
+                if not isinstance(message, dict) or message.get("type") not in self._handlers:
+                    connection.send({"type": "error", "message": "unknown message"})
+                    continue
+                self._handlers[message["type"]](connection, message)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass                                #Client went away, or the server is shutting down
+        finally:
+            self._stats["connectionsOpen"] -= 1
+            self._onLeave(connection, None)
+            writer.close()
+
+
+    def _onJoin(self, connection, message):
+        if connection.match != None:
+            connection.send({"type": "error", "message": "already in a game"})
+            return None
+        if self._waiting == None:
+            match = Match(next(self._matchIds))
+            self._matches[match.matchId] = match
+            self._waiting = match
+            colour = "white"
+        else:
+            match = self._waiting
+            self._waiting = None
+            colour = "black"
+        match.connections[colour] = connection
+        connection.match = match
+        connection.colour = colour
+        joined = match.getState()
+        joined["type"] = "joined"
+        joined["colour"] = colour
+        connection.send(joined)
+        if len(match.connections) == 2:
+            for player in match.connections.values():
+                player.send({"type": "start", "game": match.matchId})
+
+
+    def _onMove(self, connection, message):
+        match = connection.match
+        if match == None or match.finished or len(match.connections) < 2:
+            connection.send({"type": "error", "message": "no game in progress"})
+            self._stats["movesRejected"] += 1
+            return None
+        game = match.game
+        if _colourOf(game, game.getTurn()) != connection.colour:
+            connection.send({"type": "error", "message": "not your turn"})
+            self._stats["movesRejected"] += 1
+            return None
+        move = message.get("move")
+        if (not isinstance(move, list) or len(move) != 4 or
+                not all(isinstance(value, int) and not isinstance(value, bool) for value in move)):
+            connection.send({"type": "error", "message": "move must be [xFrom, yFrom, xTo, yTo]"})
+            self._stats["movesRejected"] += 1
+            return None
+        if game.makeMove(*move) == None:
+            connection.send({"type": "error", "message": "illegal move"})
+            self._stats["movesRejected"] += 1
+            return None
+        self._stats["movesPlayed"] += 1
+        board = boardString(game.getPosition())
+        state = match.getState()
+        diff = {"type": "diff", "game": match.matchId, "move": move, "changes": boardDiff(match.board, board),
+                "turn": state["turn"], "forced": state["forced"], "winner": state["winner"]}
+        match.board = board
+        for player in match.connections.values():
+            player.send(diff)
+        if state["winner"] != None:
+            self._endMatch(match)
+
+
+    def _onState(self, connection, message):
+        if connection.match == None:
+            connection.send({"type": "error", "message": "not in a game"})
+        else:
+            connection.send(connection.match.getState())
+
+
+    def _onStats(self, connection, message):
+        stats = self.getStats()
+        stats["type"] = "stats"
+        connection.send(stats)
+
+
+    def _onLeave(self, connection, message):
+        match = connection.match
+        if match == None:
+            return None
+        connection.match = None
+        del match.connections[connection.colour]
+        if self._waiting is match:
+            self._waiting = None
+        for player in match.connections.values():
+            player.send({"type": "left", "game": match.matchId, "colour": connection.colour})
+        if not match.finished:
+            self._endMatch(match)
+
+
+    def _endMatch(self, match):
+        match.finished = True
+        self._stats["gamesFinished"] += 1
+        self._matches.pop(match.matchId, None)
+
+
+
+async def _botPlayer(host, port, rng, maxMoves, latencies, idleSeconds):
+    """Joins a game and plays random legal moves, keeping its own Engine in step from the diffs.
+    Returns the number of moves it made"""
+    reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT * 4)
+
+    def send(message):
+        writer.write(json.dumps(message).encode() + b"\n")
+
+    game = Engine()
+    game.newGame()
+    send({"type": "join"})
+    colour = None
+    started = False
+    movesMade = 0
+    sentAt = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message["type"] == "joined":
+                colour = message["colour"]
+            elif message["type"] == "start":
+                started = True
+            elif message["type"] == "diff":
+                if sentAt != None:
+                    latencies.append(time.perf_counter() - sentAt)
+                    sentAt = None
+                game.makeMove(*message["move"])
+            elif message["type"] in ("left", "error"):
+                break
+            if game.getWinner() != None:
+                break
+            if started and _colourOf(game, game.getTurn()) == colour:
+                if len(game.getMoveHistory()) >= maxMoves:
+                    break
+                if idleSeconds > 0:
+                    await asyncio.sleep(rng.uniform(0, idleSeconds))
+                xFrom, yFrom, xTo, yTo, taking = rng.choice(game.getLegalMoves())
+                sentAt = time.perf_counter()
+                send({"type": "move", "move": [xFrom, yFrom, xTo, yTo]})
+                movesMade += 1
+            await writer.drain()
+        send({"type": "leave"})
+        await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return movesMade
+
+
+async def runLoadTest(host, port, games, maxMoves=200, seed=0, idleConnections=0, idleSeconds=0.0):
+    """Plays games between pairs of bots on a server, with idleConnections extra clients that
+    connect and say nothing. Returns a summary dict with moves per second and move round trip times"""
+    rng = random.Random(seed)
+    latencies = []
+    idle = []
+    for i in range(idleConnections):
+        idle.append(await asyncio.open_connection(host, port))
+    startTime = time.perf_counter()
+    bots = []
+    for i in range(games * 2):           #Bots join in pairs, so each pair plays one game
+        bots.append(asyncio.ensure_future(_botPlayer(host, port, random.Random(rng.random()), maxMoves, latencies, idleSeconds)))
+        await asyncio.sleep(0)
+    moves = sum(await asyncio.gather(*bots))
+    elapsed = time.perf_counter() - startTime
+    for reader, writer in idle:
+        writer.close()
+        await writer.wait_closed()
+    latencies.sort()
+    summary = {"games": games, "moves": moves, "seconds": elapsed, "movesPerSecond": moves / elapsed if elapsed > 0 else 0.0,
+               "idleConnections": idleConnections}
+    if latencies != []:
+        last = len(latencies) - 1
+        summary["roundTripP50Ms"] = latencies[int(last * 0.5)] * 1000
+        summary["roundTripP95Ms"] = latencies[int(last * 0.95)] * 1000
+        summary["roundTripP99Ms"] = latencies[int(last * 0.99)] * 1000
+    return summary
+
+
+async def _loadTestLocal(args):
+    """Starts a server in this process when no port is given, then runs the load test against it"""
+    server = None
+    port = args.port
+    if port == None:
+        server = GameServer(args.host, 0)
+        await server.start()
+        port = server.port
+    summary = await runLoadTest(args.host, port, args.games, args.max_moves, args.seed, args.idle, args.think)
+    if server != None:
+        waitUntil = time.perf_counter() + 5.0
+        while server.getStats()["connectionsOpen"] > 0 and time.perf_counter() < waitUntil:
+            await asyncio.sleep(0.01)       #Let the server see every client hang up before the loop stops
+        summary["server"] = server.getStats()
+        server.close()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host checkers games over TCP, or load test a server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serveParser = subparsers.add_parser("serve", help="run the game server")
+    serveParser.add_argument("--host", default="127.0.0.1")
+    serveParser.add_argument("--port", type=int, default=8765)
+    loadParser = subparsers.add_parser("load", help="play bot games against a server")
+    loadParser.add_argument("--host", default="127.0.0.1")
+    loadParser.add_argument("--port", type=int, default=None, help="server to test, by default one is started in this process")
+    loadParser.add_argument("--games", type=int, default=100)
+    loadParser.add_argument("--max-moves", type=int, default=200, help="moves before the bots give a game up")
+    loadParser.add_argument("--idle", type=int, default=0, help="extra connections that never send anything")
+    loadParser.add_argument("--think", type=float, default=0.0, help="most seconds a bot waits before each move")
+    loadParser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "serve":
+        server = GameServer(args.host, args.port)
+        try:
+            asyncio.run(server.serveForever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        print(json.dumps(asyncio.run(_loadTestLocal(args))))
@@ -0,0 +1,293 @@
+"""Endgame tablebases for positions with few pieces.
+Positions are split into slices by how many white men, white kings, black men and black kings
+they have. Each slice is solved by retrograde analysis once the slices it can move into are solved,
+and the results are stored as one 16 bit entry per position: the result for the side to move
+in the low 2 bits and the number of turns to the end of the game above them"""
+import argparse, array, itertools, mmap, multiprocessing, os, struct, sys
+from math import comb
+from engine import positionTurns, playPositionTurn, bitIndices, countBits, TOP_ROW, BOTTOM_ROW, SQUARE_COUNT
+
+
+DRAW = 0
+WIN = 1
+LOSS = 2
+INVALID = 3
+MAGIC = b"CKTB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+SLICE_ENTRY = struct.Struct("<4BQQ")
+
+
+def turnChildren(position):
+    """Returns the positions after each complete turn, a combo is followed until the other side is to move"""
+    return [playPositionTurn(position, turn) for turn in positionTurns(position)]
+
+
+def sliceOf(position):
+    """Returns (white men, white kings, black men, black kings) counts of a position"""
+    white, black, kings = position[0], position[1], position[2]
+    return (countBits(white & ~kings), countBits(white & kings), countBits(black & ~kings), countBits(black & kings))
+
+
+def sliceSize(key):
+    """Returns the number of entries in a slice, both sides to move included"""
+    size = 2
+    free = SQUARE_COUNT
+    for count in key:
+        size *= comb(free, count)
+        free -= count
+    return size
+
+
+def positionIndex(position, key):
+    """Returns the index of a position within its slice"""
+    white, black, kings, whiteToMove = position[0], position[1], position[2], position[3]
+    index = 0
+    used = 0
+    free = SQUARE_COUNT
+    for count, group in zip(key, (white & ~kings, white & kings, black & ~kings, black & kings)):
+        rank = 0
+        for i, square in enumerate(bitIndices(group)):
+            freeBelow = square - countBits(used & ((1 << square) - 1))
+            rank += comb(freeBelow, i + 1)
+        index = index * comb(free, count) + rank
+        used |= group
+        free -= count
+    return index * 2 + (0 if whiteToMove else 1)
+
+
+def slicePositions(key):
+    """Yields every placement of the pieces of a slice as (white, black, kings) bitboards"""
+    whiteMen, whiteKings, blackMen, blackKings = key
+    allSquares = range(SQUARE_COUNT)
+
+    def place(groupCounts, used):
+        if groupCounts == ():
+            yield ()
+            return
+        free = [square for square in allSquares if not (used >> square) & 1]
+        for squares in itertools.combinations(free, groupCounts[0]):
+            bits = 0
+            for square in squares:
+                bits |= 1 << square
+            for rest in place(groupCounts[1:], used | bits):
+                yield (bits,) + rest
+
+    for wm, wk, bm, bk in place(key, 0):
+        yield (wm | wk, bm | bk, wk | bk)
+
+
+def sliceKeys(maxPieces):
+    """Returns every slice with one to maxPieces pieces a side and at most maxPieces in total,
+    in an order where each slice only moves into slices before it"""
+    keys = []
+    for counts in itertools.product(range(maxPieces + 1), repeat=4):
+        whitePieces = counts[0] + counts[1]
+        blackPieces = counts[2] + counts[3]
+        if whitePieces >= 1 and blackPieces >= 1 and whitePieces + blackPieces <= maxPieces:
+            keys.append(counts)
+    keys.sort(key=sliceLevel)
+    return keys
+
+
+def sliceLevel(key):
+    """Slices on the same level never move into each other, so can be solved at the same time"""
+    return (sum(key), key[0] + key[2])
+
+
+class _SliceReader(object):
+    """Reads solved slices, either from one tablebase file or from a directory of slice files"""
+    def __init__(self):
+        self._slices = {}
+        self._files = []
+
+    def addSlice(self, key, buffer, offset):
+        self._slices[key] = (buffer, offset)
+
+    def hasSlice(self, key):
+        return key in self._slices
+
+    def openSliceFile(self, key, path):
+        dataFile = open(path, "rb")
+        buffer = mmap.mmap(dataFile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append((dataFile, buffer))
+        self.addSlice(key, buffer, 0)
+
+    def entry(self, key, index):
+        buffer, offset = self._slices[key]
+        position = offset + index * 2
+        return buffer[position] | (buffer[position + 1] << 8)
+
+    def close(self):
+        for dataFile, buffer in self._files:
+            buffer.close()
+            dataFile.close()
+        self._files = []
+        self._slices = {}
+
+
+def _childEntry(child, reader):
+    """Returns the stored entry for a position in an already solved slice"""
+    if (child[3] and child[0] == 0) or (not child[3] and child[1] == 0):
+        return LOSS            #Side to move has no pieces left, so has lost straight away
+    key = sliceOf(child)
+    return reader.entry(key, positionIndex(child, key))
+
+
+def solveSlice(key, reader):
+    """Solves one slice, all slices it can move into must be readable from reader.
+    Returns an array of 16 bit entries"""
+    size = sliceSize(key)
+    values = array.array("H", [INVALID]) * size
+    remaining = array.array("i", [0]) * size
+    lossDistance = array.array("i", [0]) * size
+    parents = {}
+    buckets = {}
+
+    def push(distance, index, result):
+        buckets.setdefault(distance, []).append((index, result))
+
+    for white, black, kings in slicePositions(key):
+        if (white & ~kings & BOTTOM_ROW) or (black & ~kings & TOP_ROW):
+            continue            #Men are kinged as soon as they reach the far row
+        for whiteToMove in (True, False):
+            position = (white, black, kings, whiteToMove, None)
+            index = positionIndex(position, key)
+            values[index] = DRAW
+            children = turnChildren(position)
+            if children == []:
+                push(0, index, LOSS)
+                continue
+            remaining[index] = len(children)
+            for child in children:
+                childKey = sliceOf(child)
+                if childKey == key:
+                    parents.setdefault(positionIndex(child, key), []).append(index)
+                    continue
+                entry = _childEntry(child, reader)
+                result = entry & 3
+                distance = (entry >> 2) + 1
+                if result == LOSS:
+                    push(distance, index, WIN)
+                elif result == WIN:
+                    remaining[index] -= 1
+                    lossDistance[index] = max(lossDistance[index], distance)
+            if remaining[index] == 0:
+                push(lossDistance[index], index, LOSS)
+    solved = bytearray(size)
+    distance = 0
+    while buckets:
+        for index, result in buckets.pop(distance, []):
+            if solved[index]:
+                continue
+            solved[index] = 1
+            values[index] = (distance << 2) | result
+            for parent in parents.get(index, ()):
+                if solved[parent]:
+                    continue
+                if result == LOSS:
+                    push(distance + 1, parent, WIN)
+                else:
+                    remaining[parent] -= 1
+                    lossDistance[parent] = max(lossDistance[parent], distance + 1)
+                    if remaining[parent] == 0:
+                        push(lossDistance[parent], parent, LOSS)
+        distance += 1
+    return values
+
+
+def _sliceFileName(workDirectory, key):
+    return os.path.join(workDirectory, "slice_%d_%d_%d_%d.bin" % key)
+
+
+def _solveSliceFile(settings):
+    """Worker process entry, solves a slice and writes it to the work directory"""
+    key, workDirectory, solvedKeys = settings
+    reader = _SliceReader()
+    for solvedKey in solvedKeys:
+        reader.openSliceFile(solvedKey, _sliceFileName(workDirectory, solvedKey))
+    values = solveSlice(key, reader)
+    reader.close()
+    if sys.byteorder != "little":
+        values.byteswap()
+    temporaryPath = _sliceFileName(workDirectory, key) + ".part"
+    with open(temporaryPath, "wb") as sliceFile:
+        values.tofile(sliceFile)
+    os.replace(temporaryPath, _sliceFileName(workDirectory, key))   #Only finished slices get their real name
+    return key
+
+
+def generate(maxPieces, outputPath, workDirectory, workers=None, progress=None):
+    """Solves every slice up to maxPieces and writes the tablebase to outputPath.
+    Slice files already in workDirectory are reused, so an interrupted run carries on where it stopped.
+    Slices on the same level are solved in parallel on workers processes"""
+    if workers == None:
+        workers = os.cpu_count() or 1
+    os.makedirs(workDirectory, exist_ok=True)
+    keys = sliceKeys(maxPieces)
+    solvedKeys = [key for key in keys if os.path.exists(_sliceFileName(workDirectory, key))]
+    with multiprocessing.Pool(workers) as pool:
+        for level, levelKeys in itertools.groupby(keys, sliceLevel):
+            toSolve = [key for key in levelKeys if key not in solvedKeys]
+            settings = [(key, workDirectory, list(solvedKeys)) for key in toSolve]
+            for key in pool.imap_unordered(_solveSliceFile, settings):
+                solvedKeys.append(key)
+                if progress != None:
+                    progress(key)
+    with open(outputPath, "wb") as outputFile:
+        outputFile.write(HEADER.pack(MAGIC, VERSION, maxPieces, len(keys)))
+        offset = HEADER.size + SLICE_ENTRY.size * len(keys)
+        for key in keys:
+            outputFile.write(SLICE_ENTRY.pack(key[0], key[1], key[2], key[3], offset, sliceSize(key)))
+            offset += sliceSize(key) * 2
+        for key in keys:
+            with open(_sliceFileName(workDirectory, key), "rb") as sliceFile:
+                outputFile.write(sliceFile.read())
+
+
+class Tablebase(object):
+    """Looks positions up in a tablebase file through mmap, so nothing is loaded up front
+    and the pages are shared between every process that opens the same file"""
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._maxPieces, sliceCount = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path + " is not a tablebase file")
+        self._reader = _SliceReader()
+        for i in range(sliceCount):
+            wm, wk, bm, bk, offset, size = SLICE_ENTRY.unpack_from(self._buffer, HEADER.size + i * SLICE_ENTRY.size)
+            self._reader.addSlice((wm, wk, bm, bk), self._buffer, offset)
+
+    def getMaxPieces(self):
+        return self._maxPieces
+
+    def probe(self, position):
+        """Returns (result, turns) for the side to move, result is WIN, LOSS or DRAW and turns is
+        how many turns until the game is won. Returns None if the position is not in the tablebase"""
+        if position[4] != None or countBits(position[0] | position[1]) > self._maxPieces:
+            return None
+        if position[0] == 0 or position[1] == 0:
+            return None
+        key = sliceOf(position)
+        if not self._reader.hasSlice(key):
+            return None
+        entry = self._reader.entry(key, positionIndex(position, key))
+        if entry & 3 == INVALID:
+            return None
+        return (entry & 3, entry >> 2)
+
+    def close(self):
+        self._reader.close()
+        self._buffer.close()
+        self._file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate checkers endgame tablebases")
+    parser.add_argument("--pieces", type=int, default=3, help="most pieces on the board, both sides together")
+    parser.add_argument("--output", default="endgame.tb")
+    parser.add_argument("--workdir", default="tablebase_work", help="where solved slices are kept so runs can resume")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    generate(args.pieces, args.output, args.workdir, args.workers, lambda key: print("solved slice", key))
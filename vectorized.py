@@ -0,0 +1,156 @@
+"""Move generation for a batch of positions at once with NumPy.
+Boards are (N, 32) arrays over the dark squares in engine square order, or (N, 8, 8) arrays
+indexed [y][x]. 1 is a white man, 2 a white king, -1 a black man, -2 a black king, 0 empty"""
+import numpy as np
+from engine import (SQUARE_COUNT, squareCoords, bitIndices, shiftUpLeft, shiftUpRight,
+                    shiftDownLeft, shiftDownRight)
+
+
+WHITE_MAN = 1
+WHITE_KING = 2
+BLACK_MAN = -1
+BLACK_KING = -2
+OFF_BOARD = SQUARE_COUNT       #Extra column in padded boards standing for squares off the edge
+OFF_BOARD_VALUE = 3
+
+#Directions are up left, up right, down left, down right, up is the way white men move
+DIRECTION_SHIFTS = (shiftUpLeft, shiftUpRight, shiftDownLeft, shiftDownRight)
+WHITE_DIRECTIONS = np.array([True, True, False, False])
+BLACK_DIRECTIONS = np.array([False, False, True, True])
+
+
+def _buildTables():
+    neighbours = np.full((SQUARE_COUNT, 4), OFF_BOARD, dtype=np.intp)
+    landings = np.full((SQUARE_COUNT, 4), OFF_BOARD, dtype=np.intp)
+    for index in range(SQUARE_COUNT):
+        for direction, shift in enumerate(DIRECTION_SHIFTS):
+            step = shift(1 << index)
+            if step:
+                neighbours[index, direction] = step.bit_length() - 1
+                jump = shift(step)
+                if jump:
+                    landings[index, direction] = jump.bit_length() - 1
+    return neighbours, landings
+
+
+NEIGHBOURS, LANDINGS = _buildTables()
+DARK_X = np.array([squareCoords(index)[0] for index in range(SQUARE_COUNT)])
+DARK_Y = np.array([squareCoords(index)[1] for index in range(SQUARE_COUNT)])
+WHITE_KING_ROW = DARK_Y == 7
+BLACK_KING_ROW = DARK_Y == 0
+
+
+def toSquares(boards):
+    """Returns boards as an (N, 32) int8 array, accepts (N, 32) or (N, 8, 8)"""
+    boards = np.asarray(boards, dtype=np.int8)
+    if boards.ndim == 3:
+        boards = boards[:, DARK_Y, DARK_X]
+    return boards
+
+
+def encodePositions(positions):
+    """positions are engine position tuples, returns (boards, whiteToMove, forced) arrays,
+    forced is -1 where no piece is partway through a combo"""
+    boards = np.zeros((len(positions), SQUARE_COUNT), dtype=np.int8)
+    whiteToMove = np.zeros(len(positions), dtype=bool)
+    forced = np.full(len(positions), -1, dtype=np.intp)
+    for row, (white, black, kings, whiteTurn, forcedIndex) in enumerate(positions):
+        for index in bitIndices(white):
+            boards[row, index] = WHITE_KING if (kings >> index) & 1 else WHITE_MAN
+        for index in bitIndices(black):
+            boards[row, index] = BLACK_KING if (kings >> index) & 1 else BLACK_MAN
+        whiteToMove[row] = whiteTurn
+        if forcedIndex != None:
+            forced[row] = forcedIndex
+    return boards, whiteToMove, forced
+
+
+def decodePosition(board, whiteToMove, forced=-1):
+    """Returns the engine position tuple of one row of a batch"""
+    white = black = kings = 0
+    for index in range(SQUARE_COUNT):
+        value = int(board[index])
+        if value > 0:
+            white |= 1 << index
+        elif value < 0:
+            black |= 1 << index
+        if value in (WHITE_KING, BLACK_KING):
+            kings |= 1 << index
+    return (white, black, kings, bool(whiteToMove), None if forced < 0 else int(forced))
+
+
+def _pad(boards):
+    padded = np.full((boards.shape[0], SQUARE_COUNT + 1), OFF_BOARD_VALUE, dtype=np.int8)
+    padded[:, :SQUARE_COUNT] = boards
+    return padded
+
+
+def _moveMasks(boards, sign, movers):
+    """Returns (steps, jumps) bool arrays of shape (N, 32, 4) for pieces in movers"""
+    padded = _pad(boards)
+    kings = np.abs(boards) == 2
+    allowed = np.where((sign > 0)[:, None, None], WHITE_DIRECTIONS, BLACK_DIRECTIONS) | kings[:, :, None]
+    allowed &= movers[:, :, None]
+    neighbour = padded[:, NEIGHBOURS]
+    landing = padded[:, LANDINGS]
+    opponent = (neighbour * sign[:, None, None] < 0) & (np.abs(neighbour) <= 2)
+    steps = allowed & (neighbour == 0)
+    jumps = allowed & opponent & (landing == 0)
+    return steps, jumps
+
+
+def legalMoveMasks(boards, whiteToMove, forced=None):
+    """Returns (legal, captureAvailable). legal is an (N, 32, 4) bool array of the squares and
+    directions the side to move may move in, only taking moves when captureAvailable is set for that board"""
+    boards = toSquares(boards)
+    sign = np.where(np.asarray(whiteToMove), 1, -1).astype(np.int8)
+    movers = boards * sign[:, None] > 0
+    if forced is not None:
+        forced = np.asarray(forced)
+        isForced = forced >= 0
+        movers &= ~isForced[:, None] | (np.arange(SQUARE_COUNT) == forced[:, None])
+    else:
+        isForced = np.zeros(boards.shape[0], dtype=bool)
+    steps, jumps = _moveMasks(boards, sign, movers)
+    captureAvailable = jumps.any(axis=(1, 2))
+    legal = np.where(captureAvailable[:, None, None], jumps, steps & ~isForced[:, None, None])
+    return legal, captureAvailable
+
+
+def moveablePieces(boards, whiteToMove, forced=None):
+    """Returns an (N, 32) bool array of the pieces that can move, like Engine._findMoveablePieces"""
+    legal, captureAvailable = legalMoveMasks(boards, whiteToMove, forced)
+    return legal.any(axis=2)
+
+
+def childPositions(boards, whiteToMove, forced=None):
+    """Plays every legal move of every board. Returns a dict of arrays with one row per move:
+    parent (row of the board it came from), fromSquare, toSquare, takenSquare (-1 if none),
+    boards, whiteToMove and forced for the resulting positions"""
+    boards = toSquares(boards)
+    whiteToMove = np.asarray(whiteToMove, dtype=bool)
+    legal, captureAvailable = legalMoveMasks(boards, whiteToMove, forced)
+    parent, fromSquare, direction = np.nonzero(legal)
+    taking = captureAvailable[parent]
+    middle = NEIGHBOURS[fromSquare, direction]
+    toSquare = np.where(taking, LANDINGS[fromSquare, direction], middle)
+    takenSquare = np.where(taking, middle, -1)
+    moveRows = np.arange(parent.shape[0])
+    children = boards[parent].copy()
+    pieces = children[moveRows, fromSquare]
+    children[moveRows, fromSquare] = 0
+    promote = ((pieces == WHITE_MAN) & WHITE_KING_ROW[toSquare]) | ((pieces == BLACK_MAN) & BLACK_KING_ROW[toSquare])
+    children[moveRows, toSquare] = np.where(promote, pieces * 2, pieces)
+    children[moveRows[taking], takenSquare[taking]] = 0
+    #A piece that has just taken carries on if it can take again
+    childSign = np.where(whiteToMove[parent], 1, -1).astype(np.int8)
+    movedOnly = np.arange(SQUARE_COUNT) == toSquare[:, None]
+    steps, jumps = _moveMasks(children, childSign, movedOnly)
+    carriesOn = taking & jumps.any(axis=(1, 2))
+    return {"parent": parent,
+            "fromSquare": fromSquare,
+            "toSquare": toSquare,
+            "takenSquare": takenSquare,
+            "boards": children,
+            "whiteToMove": np.where(carriesOn, whiteToMove[parent], ~whiteToMove[parent]),
+            "forced": np.where(carriesOn, toSquare, -1)}
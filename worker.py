@@ -0,0 +1,265 @@
+"""Runs the alpha-beta or Monte Carlo search in its own process so the game loop never waits on it.
+The game asks for a move with getMove each frame and gets None until the search has finished.
+While the person is thinking the worker guesses their reply and searches the position after it,
+if they play the guessed move that search simply carries on with a deadline"""
+import multiprocessing, queue, threading, time
+from engine import BOARD_SIZE, getGeometry, positionMoves, playPositionMove
+from search import AlphaBeta
+from parallel import ParallelSearch
+from mcts import MonteCarlo
+
+
+ENGINES = ("alphabeta", "mcts")
+
+
+def _predictReply(search, position, geometry):
+    """Plays the moves the search expects from the side to move in position until the turn passes,
+    returns the position reached or None if the game would be over"""
+    mover = position[3]
+    while position[3] == mover:
+        if positionMoves(position, geometry) == []:
+            return None
+        move = search.getTableMove(position)
+        if move == None:
+            move = search.searchPosition(position, 2)
+        position = playPositionMove(position, move, geometry)
+    if positionMoves(position, geometry) == []:
+        return None
+    return position
+
+
+def _workerMain(commands, results, maxDepth, tablebasePath, bookPath, workers, engine, boardSize):
+    """Worker process entry. A thread reads commands so a running search can be stopped, or given
+    a deadline on a ponder hit, while the main thread of the worker is busy searching"""
+    tablebase = None
+    book = None
+    geometry = getGeometry(boardSize)
+    if engine == "mcts":
+        search = MonteCarlo(boardSize=boardSize)       #Its timeLimit is set for each search
+    elif workers > 1:
+        search = ParallelSearch(None, workers, maxDepth, tablebasePath=tablebasePath, bookPath=bookPath)
+    else:
+        if tablebasePath != None:
+            from tablebase import Tablebase
+            tablebase = Tablebase(tablebasePath)
+        if bookPath != None:
+            from book import OpeningBook
+            book = OpeningBook(bookPath)
+        search = AlphaBeta(None, maxDepth, tablebase=tablebase, book=book)
+    search.stopEvent = threading.Event()
+    jobs = queue.Queue()
+    lock = threading.Lock()
+    state = {"running": None, "started": None, "hitDeadline": None, "ponderResult": None}
+
+    def readCommands():
+        while True:
+            command = commands.get()
+            with lock:
+                if command[0] == "ponderhit":
+                    if state["running"] == command[1]:
+                        #Time already spent pondering counts towards the move
+                        remaining = max(0.0, command[2] - (time.perf_counter() - state["started"]))
+                        state["hitDeadline"] = time.perf_counter() + remaining
+                        search.setDeadline(remaining)
+                        continue
+                else:
+                    search.stopEvent.set()     #Anything else replaces whatever is being worked on
+                #Queued under the lock so the main loop can not clear the stop between the two
+                jobs.put(command)
+            if command[0] == "quit":
+                return
+
+    def reportProgress(depth, score, move, nodes):
+        with lock:
+            if state["hitDeadline"] != None:       #In case the search set its own deadline after the hit gave it one
+                search.setDeadline(max(0.0, state["hitDeadline"] - time.perf_counter()))
+        results.put(("progress", state["running"], depth, score, nodes))
+
+    threading.Thread(target=readCommands, daemon=True).start()
+    search.onProgress = reportProgress
+    while True:
+        command = jobs.get()
+        with lock:
+            replaced = not jobs.empty()
+            if not replaced:
+                search.stopEvent.clear()       #Only once nothing newer is waiting, whose stop would be lost
+        if command[0] == "quit":
+            break
+        if command[0] == "stop" or replaced:
+            continue                           #Stopped, or already replaced by a newer command
+        jobId = command[1]
+        if command[0] == "ponderhit":
+            ponderResult = state["ponderResult"]
+            if ponderResult != None and ponderResult[0] == jobId:
+                results.put(("done", jobId, ponderResult[1], ponderResult[2]))
+                continue
+            command = ("search", jobId, command[3], command[2])
+        if command[0] == "search":
+            with lock:
+                state["running"] = jobId
+            search.timeLimit = command[3]
+            move = search.searchPosition(command[2])
+            with lock:
+                state["running"] = None
+            if not search.stopEvent.is_set():
+                results.put(("done", jobId, move, search.getStats()))
+        elif command[0] == "ponder":
+            predicted = _predictReply(search, command[2], geometry)
+            results.put(("pondering", jobId, predicted))
+            if predicted == None:
+                continue
+            with lock:
+                if not jobs.empty():               #A ponder hit from now on is queued rather than missed
+                    continue
+                state["running"] = jobId
+                state["started"] = time.perf_counter()
+                state["hitDeadline"] = None
+                search.timeLimit = None
+            move = search.searchPosition(predicted)
+            with lock:
+                state["running"] = None
+                hit = state["hitDeadline"] != None
+                state["hitDeadline"] = None
+            if hit:
+                results.put(("done", jobId, move, search.getStats()))
+            elif not search.stopEvent.is_set():
+                state["ponderResult"] = (jobId, move, search.getStats())
+    if engine == "alphabeta" and workers > 1:
+        search.close()
+    if tablebase != None:
+        tablebase.close()
+    if book != None:
+        book.close()
+
+
+class SearchWorker(object):
+    """Computer player whose search runs in a separate process. timeLimit is seconds per move,
+    tablebasePath and bookPath are optional files for the search to use and with ponder it
+    thinks on the opponent's time. With more than one of workers it runs a parallel.ParallelSearch.
+    engine is "alphabeta", or "mcts" for a mcts.MonteCarlo on a boardSize board, which uses
+    neither maxDepth, the files nor workers"""
+    def __init__(self, timeLimit=1.0, maxDepth=64, tablebasePath=None, bookPath=None, ponder=True, workers=1,
+                 engine="alphabeta", boardSize=BOARD_SIZE):
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine " + repr(engine))
+        if engine == "mcts":
+            workers = 1
+        context = multiprocessing.get_context("spawn")     #A clean process, nothing of pygame is copied over
+        self.timeLimit = timeLimit
+        self.pondering = ponder
+        self._commands = context.Queue()
+        self._results = context.Queue()
+        #Daemon processes can not start the helpers of a parallel search
+        self._process = context.Process(target=_workerMain, daemon=workers == 1,
+                                        args=(self._commands, self._results, maxDepth, tablebasePath, bookPath, workers,
+                                              engine, boardSize))
+        self._process.start()
+        self._nextJob = 0
+        self._searchJob = None         #Job whose result getMove is waiting for
+        self._searchPosition = None
+        self._ponderJob = None
+        self._ponderFrom = None        #Position pondering started from, the opponent to move
+        self._ponderPosition = None    #Position after the guessed reply, being searched
+        self._result = None
+        self._progress = None
+        self._stats = {}
+        self.ponderHits = 0
+        self.ponderMisses = 0
+
+
+    def _newJob(self):
+        self._nextJob += 1
+        return self._nextJob
+
+
+    def _readResults(self):
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if result[0] == "progress" and result[1] != None and result[1] in (self._searchJob, self._ponderJob):
+                self._progress = {"depth": result[2], "score": result[3], "nodes": result[4], "pondering": result[1] != self._searchJob}
+            elif result[0] == "pondering" and result[1] == self._ponderJob:
+                self._ponderPosition = result[2]
+            elif result[0] == "done" and result[1] == self._searchJob:
+                self._result = result[2]
+                self._stats = result[3]
+
+
+    def getMove(self, position):
+        """Never waits. Returns the move (fromIndex, toIndex, takenIndex) for position once it has been found,
+        otherwise None. The search is started the first time a position is asked about"""
+        self._readResults()
+        if position != self._searchPosition:
+            self._searchPosition = position
+            self._result = None
+            self._progress = None
+            if self._ponderPosition != None and position == self._ponderPosition:
+                self._searchJob = self._ponderJob
+                self._commands.put(("ponderhit", self._ponderJob, self.timeLimit, position))
+                self.ponderHits += 1
+            else:
+                if self._ponderJob != None:
+                    self.ponderMisses += 1
+                self._searchJob = self._newJob()
+                self._commands.put(("search", self._searchJob, position, self.timeLimit))
+            self._ponderJob = None
+            self._ponderFrom = None
+            self._ponderPosition = None
+        move = self._result
+        if move != None:
+            self._searchJob = None
+            self._searchPosition = None
+            self._result = None
+        return move
+
+
+    def ponder(self, position):
+        """position has the opponent to move, starts thinking about the reply to their likely move.
+        Asking again about the same position does nothing"""
+        if not self.pondering or position == self._ponderFrom:
+            return None
+        self._readResults()
+        self._searchJob = None
+        self._searchPosition = None
+        self._ponderJob = self._newJob()
+        self._ponderFrom = position
+        self._ponderPosition = None
+        self._commands.put(("ponder", self._ponderJob, position))
+
+
+    def cancel(self):
+        """Stops any search or pondering straight away, results already on their way are ignored"""
+        self._commands.put(("stop",))
+        self._searchJob = None
+        self._searchPosition = None
+        self._ponderJob = None
+        self._ponderFrom = None
+        self._ponderPosition = None
+        self._result = None
+        self._progress = None
+
+
+    def getProgress(self):
+        """Returns dict of depth, score, nodes and pondering for the deepest finished depth
+        of the current search, or None"""
+        self._readResults()
+        return self._progress
+
+
+    def getStats(self):
+        """Returns the stats of the last search a move was returned from, as AlphaBeta.getStats"""
+        stats = dict(self._stats)
+        stats["ponderHits"] = self.ponderHits
+        stats["ponderMisses"] = self.ponderMisses
+        return stats
+
+
+    def close(self):
+        """Stops the worker process"""
+        if self._process.is_alive():
+            self._commands.put(("quit",))
+            self._process.join(1.0)
+            if self._process.is_alive():
+                self._process.terminate()